@@ -0,0 +1,4 @@
+"""Benchmarks for the CCTV monitoring hot paths.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_mjpeg_parser``.
+"""
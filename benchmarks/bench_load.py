@@ -0,0 +1,335 @@
+"""End-to-end load benchmark: N simulated cameras, M live viewers.
+
+Starts a synthetic camera server (benchmarks.sim_camera) and, with
+--launch, a private main.py server in a scratch directory. Registers N
+cameras through /api/camera/add, opens M /video_feed clients spread across
+them, and reports delivered fps, end-to-end latency, server CPU per stream
+and memory. Results are written as JSON; pass --baseline with an earlier
+result to flag regressions.
+
+Usage: python -m benchmarks.bench_load --launch [--cameras N] [--viewers M]
+       [--duration S] [--mode passthrough|overlay] [--profile NAME]
+       [--workers P] [--baseline FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+import requests
+
+from benchmarks.sim_camera import MOTION_PATTERNS, read_comment, read_time_code
+from main import MJPEGParser, read_http_stream
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMERA_PREFIX = "bench-"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+# Relative change that counts as a regression when comparing to a baseline
+REGRESSION_TOLERANCE = 0.10
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except (OSError, requests.RequestException):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def port_open(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def process_tree(pid):
+    """pid and all of its descendants, from /proc"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, ()))
+    return tree
+
+
+def sample_process(pid):
+    """(CPU seconds, RSS bytes) summed over a process and its descendants"""
+    cpu = rss = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1]) * 1024
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 2) if values else None
+
+
+class ViewerClient:
+    """One /video_feed viewer recording arrivals and latency after warm-up"""
+
+    def __init__(self, url, decode):
+        self.url = url
+        self.decode = decode
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+        self.error = None
+        self.measuring = False
+
+    async def run(self):
+        parser = MJPEGParser()
+        try:
+            async for chunk in read_http_stream(self.url):
+                for jpg in parser.feed(chunk):
+                    if not self.measuring:
+                        continue
+                    arrived = time.time()
+                    self.frames += 1
+                    self.bytes += len(jpg)
+                    sent = read_comment(jpg)
+                    if sent is None and self.decode:
+                        frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                        sent = read_time_code(frame, arrived) if frame is not None else None
+                    if sent is not None:
+                        self.latencies.append((arrived - sent) * 1000.0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+
+
+async def drive_viewers(base_url, cameras, args, server_pid):
+    clients = []
+    for index in range(args.viewers):
+        camera = cameras[index % len(cameras)]
+        url = f"{base_url}/video_feed/{camera}?mode={args.mode}"
+        if args.profile:
+            url += f"&profile={args.profile}"
+        clients.append(ViewerClient(url, decode=args.stamp == "pixels"))
+    tasks = [asyncio.create_task(client.run()) for client in clients]
+
+    await asyncio.sleep(args.warmup)
+    for client in clients:
+        client.measuring = True
+    started = time.monotonic()
+    cpu_start, rss = sample_process(server_pid) if server_pid else (None, None)
+    rss_peak = rss
+    while time.monotonic() - started < args.duration:
+        await asyncio.sleep(1.0)
+        if server_pid:
+            _, rss = sample_process(server_pid)
+            rss_peak = max(rss_peak, rss)
+    elapsed = time.monotonic() - started
+    for client in clients:
+        client.measuring = False
+    cpu_end = sample_process(server_pid)[0] if server_pid else None
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return clients, elapsed, cpu_start, cpu_end, rss, rss_peak
+
+
+def summarize(clients, elapsed, cpu_start, cpu_end, rss, rss_peak, args):
+    fps = [client.frames / elapsed for client in clients]
+    latencies = [value for client in clients for value in client.latencies]
+    results = {
+        "elapsed_seconds": round(elapsed, 2),
+        "frames_delivered": sum(client.frames for client in clients),
+        "bytes_delivered": sum(client.bytes for client in clients),
+        "delivered_fps_mean": round(float(np.mean(fps)), 2) if fps else 0.0,
+        "delivered_fps_min": round(min(fps), 2) if fps else 0.0,
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "latency_ms_p99": percentile(latencies, 99),
+        "latency_samples": len(latencies),
+        "client_errors": sorted({client.error for client in clients if client.error})
+    }
+    if cpu_start is not None:
+        cpu_percent = (cpu_end - cpu_start) / elapsed * 100.0
+        results.update({
+            "server_cpu_percent": round(cpu_percent, 1),
+            "server_cpu_percent_per_camera": round(cpu_percent / args.cameras, 2),
+            "server_cpu_percent_per_viewer": round(cpu_percent / args.viewers, 2) if args.viewers else None,
+            "server_rss_mb": round(rss / 1e6, 1),
+            "server_rss_peak_mb": round(rss_peak / 1e6, 1)
+        })
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print deltas against a baseline result; True if anything regressed"""
+    checks = (("delivered_fps_mean", -1), ("delivered_fps_min", -1), ("latency_ms_p95", 1),
+              ("server_cpu_percent_per_viewer", 1), ("server_rss_peak_mb", 1))
+    regressed = False
+    print(f"Compared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp')}):")
+    for key, worse in checks:
+        old, new = baseline["results"].get(key), results.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        bad = change * worse > REGRESSION_TOLERANCE
+        regressed |= bad
+        print(f"  {key:<32} {old:>10} -> {new:<10} {change:+.1%}{'  REGRESSION' if bad else ''}")
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--cameras", type=int, default=4)
+    ap.add_argument("--viewers", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--warmup", type=float, default=5.0)
+    ap.add_argument("--mode", choices=("passthrough", "overlay"), default="passthrough")
+    ap.add_argument("--profile", default=None, help="overlay stream profile, e.g. medium")
+    ap.add_argument("--width", type=int, default=1280)
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--fps", type=float, default=15.0)
+    ap.add_argument("--motion", choices=MOTION_PATTERNS, default="sweep")
+    ap.add_argument("--jitter", type=float, default=0.0, help="camera send jitter, ms")
+    ap.add_argument("--stamp", choices=("comment", "pixels"), default=None,
+                    help="latency stamp; defaults to pixels for overlay viewers")
+    ap.add_argument("--launch", action="store_true", help="start a private main.py server")
+    ap.add_argument("--workers", type=int, default=0, help="CCTV_WORKER_PROCESSES for --launch")
+    ap.add_argument("--server", default=None, help="URL of an already running server")
+    ap.add_argument("--server-pid", type=int, default=None, help="pid of that server, for CPU and memory")
+    ap.add_argument("--output", default=None)
+    ap.add_argument("--baseline", default=None)
+    args = ap.parse_args()
+    if args.stamp is None:
+        args.stamp = "pixels" if args.mode == "overlay" else "comment"
+    if not args.launch and not args.server:
+        ap.error("pass --launch or --server URL")
+
+    processes = []
+    cameras = []
+    scratch = tempfile.TemporaryDirectory(prefix="cctv-bench-")
+    try:
+        sim_port = free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.sim_camera", "--port", str(sim_port),
+             "--width", str(args.width), "--height", str(args.height), "--fps", str(args.fps),
+             "--motion", args.motion, "--jitter", str(args.jitter), "--stamp", args.stamp],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL))
+        wait_for(lambda: port_open(sim_port), 30, "camera simulator")
+
+        server_pid = args.server_pid
+        base_url = args.server.rstrip("/") if args.server else None
+        if args.launch:
+            port = free_port()
+            env = dict(os.environ, CCTV_WORKER_PROCESSES=str(args.workers))
+            # Own working directory so cameras.json and recordings stay out of the repo
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", REPO_ROOT,
+                 "--port", str(port), "--log-level", "warning"],
+                cwd=scratch.name, env=env)
+            processes.append(server)
+            server_pid = server.pid
+            base_url = f"http://127.0.0.1:{port}"
+        wait_for(lambda: requests.get(f"{base_url}/api/health", timeout=2).ok, 60, "CCTV server")
+
+        for index in range(args.cameras):
+            name = f"{CAMERA_PREFIX}{index}"
+            response = requests.post(f"{base_url}/api/camera/add", timeout=10,
+                                     json={"name": name, "url": f"http://127.0.0.1:{sim_port}/cam/{index}"})
+            response.raise_for_status()
+            cameras.append(name)
+
+        print(f"{args.cameras} cameras {args.width}x{args.height}@{args.fps} ({args.motion}), "
+              f"{args.viewers} {args.mode} viewers, {args.duration:.0f}s after {args.warmup:.0f}s warm-up")
+        clients, elapsed, cpu_start, cpu_end, rss, rss_peak = asyncio.run(
+            drive_viewers(base_url, cameras, args, server_pid))
+        results = summarize(clients, elapsed, cpu_start, cpu_end, rss, rss_peak, args)
+        try:
+            health = requests.get(f"{base_url}/api/health", timeout=5).json()
+            results["camera_loops"] = {name: health.get("cameras", {}).get(name) for name in cameras}
+        except (requests.RequestException, ValueError):
+            pass
+    finally:
+        if not args.launch:
+            for name in cameras:
+                try:
+                    requests.delete(f"{base_url}/api/camera/{name}", timeout=10)
+                except requests.RequestException:
+                    pass
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        scratch.cleanup()
+
+    report = {
+        "benchmark": "load",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "host": {"cpus": os.cpu_count(), "python": platform.python_version(), "machine": platform.machine()},
+        "config": vars(args),
+        "results": results
+    }
+    for key, value in results.items():
+        if key != "camera_loops":
+            print(f"  {key:<32} {value}")
+
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results",
+                                         f"load_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Microbenchmark: MJPEGParser vs the original bytes-concatenation loop.
+
+Usage: python -m benchmarks.bench_mjpeg_parser [--frames N] [--chunk BYTES]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from main import MJPEGParser
+
+
+def make_stream(frames, width, height, content_length=True):
+    """Build a multipart MJPEG byte stream from synthetic frames"""
+    rng = np.random.default_rng(0)
+    parts = []
+    for i in range(frames):
+        img = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        jpg = buf.tobytes()
+        header = b'--frame\r\nContent-Type: image/jpeg\r\n'
+        if content_length:
+            header += b'Content-Length: %d\r\n' % len(jpg)
+        parts.append(header + b'\r\n' + jpg + b'\r\n')
+    return b''.join(parts)
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def legacy_loop(chunks):
+    """The pre-MJPEGParser loop from generate_frames()"""
+    found = 0
+    bytes_data = bytes()
+    for chunk in chunks:
+        bytes_data += chunk
+        a = bytes_data.find(b'\xff\xd8')
+        b = bytes_data.find(b'\xff\xd9')
+        if a != -1 and b != -1:
+            jpg = bytes_data[a:b+2]
+            bytes_data = bytes_data[b+2:]
+            found += 1
+    return found
+
+
+def parser_loop(chunks):
+    parser = MJPEGParser()
+    found = 0
+    for chunk in chunks:
+        found += len(parser.feed(chunk))
+    return found
+
+
+def run(name, func, chunks, total_bytes, repeat):
+    best = float("inf")
+    found = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        found = func(chunks)
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {name:<8} {total_bytes / best / 1e6:10.1f} MB/s  frames={found}")
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--chunk", type=int, default=8192)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    scenarios = [
+        ("large frames, Content-Length", args.width, args.height, True, args.chunk),
+        ("large frames, markers only", args.width, args.height, False, args.chunk),
+        ("small frames, several per chunk", 64, 48, True, 65536),
+    ]
+    for title, width, height, content_length, chunk in scenarios:
+        data = make_stream(args.frames, width, height, content_length)
+        chunks = chunked(data, chunk)
+        print(f"{title}: {len(data) / 1e6:.1f} MB, {args.frames} frames, {chunk} B chunks")
+        legacy = run("legacy", legacy_loop, chunks, len(data), args.repeat)
+        parser = run("parser", parser_loop, chunks, len(data), args.repeat)
+        print(f"  speedup  {legacy / parser:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
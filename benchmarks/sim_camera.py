@@ -0,0 +1,212 @@
+"""Synthetic MJPEG camera server for end-to-end benchmarks.
+
+Every request path is an independent camera stream, e.g.
+http://127.0.0.1:9000/cam/1, so one server can stand in for many cameras.
+Each frame carries its send time in a JPEG comment segment, which survives
+passthrough viewing unchanged. With --stamp pixels the time is also drawn
+as a bar code along the bottom edge, which survives re-encoding and
+resizing so overlay streams can be timed too (at the cost of encoding
+every frame here).
+
+Usage: python -m benchmarks.sim_camera [--port P] [--width W] [--height H]
+       [--fps F] [--motion static|sweep|noise|burst] [--jitter MS]
+       [--stamp comment|pixels]
+"""
+import argparse
+import asyncio
+import random
+import struct
+import time
+
+import cv2
+import numpy as np
+
+MOTION_PATTERNS = ("static", "sweep", "noise", "burst")
+
+# Pixel time code: a start pair (white, black) then STAMP_BITS bits of
+# milliseconds since the epoch, in STAMP_BLOCKS equal blocks across the width
+STAMP_BITS = 44
+STAMP_BLOCKS = 48
+COMMENT_PREFIX = b"cctv-bench "
+
+
+def stamp_band_height(height):
+    return max(8, height // 24)
+
+
+def draw_time_code(frame, timestamp):
+    """Draw the send time as a black/white bar code along the bottom edge"""
+    height, width = frame.shape[:2]
+    band = stamp_band_height(height)
+    value = int(timestamp * 1000) & ((1 << STAMP_BITS) - 1)
+    bits = [1, 0] + [(value >> (STAMP_BITS - 1 - i)) & 1 for i in range(STAMP_BITS)]
+    for index, bit in enumerate(bits):
+        x0 = index * width // STAMP_BLOCKS
+        x1 = (index + 1) * width // STAMP_BLOCKS
+        frame[height - band:, x0:x1] = 255 if bit else 0
+
+
+def read_time_code(frame, now=None):
+    """Send time encoded by draw_time_code, or None if no code is found"""
+    height, width = frame.shape[:2]
+    band = stamp_band_height(height)
+    if width < STAMP_BLOCKS * 2 or band < 2:
+        return None
+    row = frame[height - band // 2]
+    if row.ndim > 1:
+        row = row.mean(axis=1)
+    bits = []
+    for index in range(STAMP_BITS + 2):
+        center = (2 * index + 1) * width // (2 * STAMP_BLOCKS)
+        bits.append(1 if row[max(0, center - 1):center + 2].mean() > 127 else 0)
+    if bits[:2] != [1, 0]:
+        return None
+    value = 0
+    for bit in bits[2:]:
+        value = (value << 1) | bit
+    # Restore the high bits dropped by the modulus from the reader's clock
+    now_ms = int((time.time() if now is None else now) * 1000)
+    value |= now_ms & ~((1 << STAMP_BITS) - 1)
+    return value / 1000.0
+
+
+def add_comment(jpg, timestamp):
+    """Insert a COM segment holding the send time right after SOI"""
+    payload = COMMENT_PREFIX + b"%.6f" % timestamp
+    return jpg[:2] + b"\xff\xfe" + struct.pack(">H", len(payload) + 2) + payload + jpg[2:]
+
+
+def read_comment(jpg):
+    """Send time from the COM segment written by add_comment, or None"""
+    if jpg[2:4] != b"\xff\xfe":
+        return None
+    length = struct.unpack(">H", jpg[4:6])[0]
+    payload = jpg[6:4 + length]
+    if not payload.startswith(COMMENT_PREFIX):
+        return None
+    return float(payload[len(COMMENT_PREFIX):])
+
+
+class SceneGenerator:
+    """Frames for one motion pattern, rendered from a fixed textured background"""
+
+    def __init__(self, width, height, fps, motion, seed=0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.motion = motion
+        rng = np.random.default_rng(seed)
+        # Smooth texture so frames compress like a real scene, not like noise
+        small = rng.integers(40, 200, (max(2, height // 16), max(2, width // 16), 3), dtype=np.uint8)
+        self.background = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        self._rng = rng
+
+    @property
+    def cycle_frames(self):
+        """Frames after which the pattern repeats"""
+        seconds = {"static": 0, "sweep": 4, "noise": 2, "burst": 10}[self.motion]
+        return max(1, int(seconds * self.fps))
+
+    def render(self, index):
+        frame = self.background.copy()
+        t = index / self.fps
+        if self.motion == "sweep" or (self.motion == "burst" and t % 10 < 2):
+            box = max(8, self.height // 6)
+            period = 4.0 if self.motion == "sweep" else 2.0
+            x = int((t % period) / period * (self.width - box))
+            y = (self.height - box) // 2
+            frame[y:y + box, x:x + box] = (255, 255, 255)
+        elif self.motion == "noise":
+            noise = self._rng.integers(-12, 13, frame.shape, dtype=np.int16)
+            frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        return frame
+
+
+class SimCameraServer:
+    """asyncio MJPEG server; each connection gets its own frame clock"""
+
+    def __init__(self, width=640, height=480, fps=15.0, motion="sweep", jitter_ms=0.0,
+                 quality=80, stamp="comment"):
+        self.fps = fps
+        self.jitter = jitter_ms / 1000.0
+        self.quality = quality
+        self.stamp = stamp
+        self.scene = SceneGenerator(width, height, fps, motion)
+        self.connections = 0
+        self.frames_sent = 0
+        self._cycle = None
+        if stamp == "comment":
+            # Encode the pattern once; per frame only the comment is spliced in
+            self._cycle = [self._encode(self.scene.render(i)) for i in range(self.scene.cycle_frames)]
+
+    def _encode(self, frame):
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buf.tobytes()
+
+    def frame(self, index, timestamp):
+        if self._cycle is not None:
+            jpg = self._cycle[index % len(self._cycle)]
+        else:
+            image = self.scene.render(index)
+            draw_time_code(image, timestamp)
+            jpg = self._encode(image)
+        return add_comment(jpg, timestamp)
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            start = time.monotonic()
+            index = 0
+            while True:
+                timestamp = time.time()
+                jpg = self.frame(index, timestamp)
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpg)
+                             + jpg + b"\r\n")
+                await writer.drain()
+                self.frames_sent += 1
+                index += 1
+                due = start + index / self.fps
+                if self.jitter:
+                    due += random.gauss(0.0, self.jitter)
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--fps", type=float, default=15.0)
+    ap.add_argument("--motion", choices=MOTION_PATTERNS, default="sweep")
+    ap.add_argument("--jitter", type=float, default=0.0, help="send-time jitter, ms standard deviation")
+    ap.add_argument("--quality", type=int, default=80)
+    ap.add_argument("--stamp", choices=("comment", "pixels"), default="comment")
+    args = ap.parse_args()
+
+    server = SimCameraServer(args.width, args.height, args.fps, args.motion, args.jitter,
+                             args.quality, args.stamp)
+    print(f"Serving {args.width}x{args.height} @ {args.fps} fps ({args.motion}) "
+          f"on http://{args.host}:{args.port}/cam/<n>", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
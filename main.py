@@ -1,23 +1,46 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, JSONResponse, FileResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import cv2
 import requests
+import requests.adapters
 import numpy as np
 import uvicorn
 import threading
+import queue
 import time
 import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from email.utils import formatdate
+from urllib.parse import urlsplit, urljoin, unquote
 import json
+import math
+import asyncio
+import base64
+import ssl
+import sqlite3
+import shutil
+import bisect
+import signal
+import struct
+import zlib
+import multiprocessing
+from multiprocessing import shared_memory
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
+RECORDINGS_DIR = "recordings"
+THUMBNAILS_DIR = os.path.join(RECORDINGS_DIR, "thumbnails")
+
 # Create static files directory if it doesn't exist
 os.makedirs("static", exist_ok=True)
-os.makedirs("recordings", exist_ok=True)
+os.makedirs(RECORDINGS_DIR, exist_ok=True)
+os.makedirs(THUMBNAILS_DIR, exist_ok=True)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -44,11 +67,115 @@ camera_recordings = {}
 motion_alerts = {}
 recording_states = {}
 camera_settings = {}
+camera_hubs = {}
+mosaic_streams = {}
+frame_executor = None
+frame_worker_pool = None
+
+# Live view modes: "overlay" re-encodes with timestamp/REC burned in,
+# "passthrough" forwards the camera's own JPEG bytes untouched
+STREAM_MODES = ("overlay", "passthrough")
+
+# Named overlay stream profiles: output width (None = source), frame rate cap
+# (None = every frame) and JPEG quality. Cameras may override or add profiles
+# through the stream_profiles setting.
+STREAM_PROFILES = {
+    "full": {"width": None, "max_fps": None, "quality": 95},
+    "medium": {"width": 960, "max_fps": 15, "quality": 75},
+    "thumb": {"width": 320, "max_fps": 5, "quality": 60}
+}
+
+DEFAULT_CAMERA_SETTINGS = {
+    "motion_sensitivity": 500,
+    "recording_quality": "high",
+    "auto_record_motion": False,
+    "notification_enabled": True,
+    "stream_mode": "overlay",
+    "stream_profile": "full",
+    "stream_profiles": None,
+    "motion_fps": 5,
+    "motion_roi": None,
+    "segment_seconds": 300,
+    "pre_roll_seconds": 5,
+    "post_roll_seconds": 10,
+    "pre_roll_max_bytes": 8 * 1024 * 1024,
+    "retention_max_bytes": None,
+    "retention_max_age_days": None,
+    "adaptive_rate": False,
+    "idle_after_seconds": 30,
+    "idle_stream_fps": 1,
+    "idle_record_fps": 1
+}
+
+# Motion analysis runs on a grayscale proxy this many pixels wide
+MOTION_PROXY_WIDTH = 160
+
+# Motion events: hits closer together than this merge into one stored event,
+# which keeps the bounding boxes (largest first) of its peak frame
+MOTION_EVENT_GAP_SECONDS = 5
+MOTION_MAX_BOXES = 8
+
+# Ingest: upstream read timeout, redirects followed per connect, and threads
+# for decode/motion/encode work
+STREAM_READ_TIMEOUT = 10
+STREAM_MAX_REDIRECTS = 5
+FRAME_WORKERS = os.cpu_count() or 4
+
+# Worker mode: with CCTV_WORKER_PROCESSES > 0 cameras are sharded across that
+# many processes that do ingest and all pixel work, handing frames back through
+# shared-memory rings (slots per ring, bytes per JPEG slot). Decoded frames for
+# server-side compositing are published at most WORKER_DECODED_WIDTH wide.
+WORKER_PROCESSES = int(os.environ.get("CCTV_WORKER_PROCESSES", "0"))
+WORKER_RING_SLOTS = 4
+WORKER_RING_SLOT_BYTES = 2 * 1024 * 1024
+WORKER_DECODED_WIDTH = 640
+WORKER_POLL_SECONDS = 0.005
+
+# Frame-loop stages timed per camera, and latency histogram buckets (seconds)
+FRAME_STAGES = ("parse", "decode", "motion", "overlay", "encode")
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Mosaic compositors shut down after this long without viewers
+MOSAIC_IDLE_SECONDS = 10
+
+# Frames buffered between an ingest worker and its recording writer, and how
+# long a new recording waits for the camera's measured fps before estimating it
+RECORDING_QUEUE_FRAMES = 120
+RECORDING_FPS_WAIT_SECONDS = 5
+
+# Health monitor: probe interval and backoff cap for cameras without a live
+# stream, and how old a stream's last frame may be before it counts as stale
+HEALTH_TICK_SECONDS = 1
+HEALTH_INTERVAL_SECONDS = 30
+HEALTH_MAX_BACKOFF_SECONDS = 600
+HEALTH_PROBE_TIMEOUT = 3
+HEALTH_PROBE_WORKERS = 8
+STREAM_STALE_SECONDS = 5
+
+# Event bus: events kept for resume, and per-client backlog before disconnect
+EVENT_HISTORY = 1000
+EVENT_QUEUE_SIZE = 256
+EVENT_KEEPALIVE_SECONDS = 15
+
+# Recording thumbnails: height in pixels, frames per sprite strip, cache lifetime
+THUMBNAIL_HEIGHT = 60
+SPRITE_FRAMES = 8
+THUMBNAIL_CACHE_SECONDS = 365 * 24 * 3600
+
+# Retention: global budgets for recordings (0 = unlimited), disk space to keep
+# free (0 = off), and how often budgets are re-checked between segment closes.
+# Per-camera budgets come from the retention_* camera settings.
+RETENTION_MAX_BYTES = int(os.environ.get("CCTV_RETENTION_MAX_BYTES", "0"))
+RETENTION_MAX_AGE_DAYS = float(os.environ.get("CCTV_RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MIN_FREE_BYTES = int(os.environ.get("CCTV_RETENTION_MIN_FREE_BYTES", "0"))
+RETENTION_INTERVAL_SECONDS = 60
+RETENTION_BATCH = 50
+
 system_stats = {
     "start_time": datetime.now(),
     "total_recordings": 0,
     "total_motion_events": 0,
-    "data_usage": 0
+    "data_usage": {}
 }
 
 def save_cameras():
@@ -56,117 +183,2401 @@ def save_cameras():
     with open(CAMERAS_FILE, "w") as f:
         json.dump(CAMERAS, f, indent=4)
 
-def check_camera_health():
-    """Background task to monitor camera health"""
-    while True:
-        for cam_name, cam_url in CAMERAS.items():
+def get_camera_setting(camera_name: str, key: str):
+    """Look up one setting for a camera, falling back to the defaults"""
+    return camera_settings.get(camera_name, {}).get(key, DEFAULT_CAMERA_SETTINGS.get(key))
+
+def get_stream_profiles(camera_name: str):
+    """Stream profiles for a camera: defaults merged with per-camera overrides"""
+    profiles = {name: dict(profile) for name, profile in STREAM_PROFILES.items()}
+    for name, overrides in (get_camera_setting(camera_name, "stream_profiles") or {}).items():
+        profiles.setdefault(name, dict(STREAM_PROFILES["full"])).update(overrides)
+    return profiles
+
+class EventSubscriber:
+    """Per-client event queue bridged onto the client's asyncio loop"""
+
+    def __init__(self, loop, max_pending=EVENT_QUEUE_SIZE):
+        self._loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def push(self, event):
+        # Publishers run on ingest/writer/monitor threads
+        self._loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow: the stream is closed and the client resumes from history
+            self.overflowed = True
+
+
+class EventBus:
+    """In-process publish/subscribe channel for dashboard events.
+
+    Every event gets a monotonically increasing sequence number and is kept
+    in a bounded history, so a client that reconnects with the last sequence
+    it saw receives exactly the events it missed.
+    """
+
+    def __init__(self, history=EVENT_HISTORY):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def publish(self, event_type: str, data: dict):
+        with self._lock:
+            self._seq += 1
+            event = {
+                "seq": self._seq,
+                "type": event_type,
+                "timestamp": datetime.now().isoformat(),
+                "data": data
+            }
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+        return event
+
+    def since(self, seq: int, event_type: str = None):
+        """Events from history newer than seq, optionally of one type"""
+        with self._lock:
+            return [event for event in self._history
+                    if event["seq"] > seq and (event_type is None or event["type"] == event_type)]
+
+    def subscribe(self, loop, last_seq=None):
+        subscriber = EventSubscriber(loop)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = [event for event in self._history if event["seq"] > last_seq] if last_seq is not None else []
+        for event in backlog[-subscriber.queue.maxsize:]:
+            subscriber.queue.put_nowait(event)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+event_bus = EventBus()
+
+
+def update_camera_status(cam_name: str, status: dict):
+    """Store a camera's health and publish it when the state changes"""
+    previous = camera_status.get(cam_name, {}).get("status")
+    camera_status[cam_name] = status
+    if status.get("status") != previous:
+        event_bus.publish("health", {"camera": cam_name, **status})
+
+class HealthMonitor:
+    """Concurrent camera health monitor.
+
+    Cameras with a live ingest stream are judged from its telemetry (age of
+    the last frame and measured fps) with no extra request. Other cameras
+    are probed on a small thread pool sharing one pooled HTTP session, and
+    each failure doubles that camera's probe interval up to
+    HEALTH_MAX_BACKOFF_SECONDS, so dead cameras cannot slow down the rest.
+    """
+
+    def __init__(self, workers=HEALTH_PROBE_WORKERS):
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="health-probe")
+        self._next_probe = {}
+        self._failures = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        while True:
             try:
-                response = requests.head(cam_url, timeout=3)
-                camera_status[cam_name] = {
-                    "status": "online" if response.status_code == 200 else "offline",
-                    "last_check": datetime.now().isoformat(),
-                    "response_time": response.elapsed.total_seconds() if response.elapsed else 0
-                }
+                self.tick()
             except Exception as e:
-                camera_status[cam_name] = {
-                    "status": "offline",
+                print(f"Health monitor error: {e}")
+            time.sleep(HEALTH_TICK_SECONDS)
+
+    def tick(self):
+        now = time.monotonic()
+        cameras = dict(CAMERAS)
+        for cam_name, cam_url in cameras.items():
+            hub = camera_hubs.get(cam_name)
+            if hub is not None and hub.last_frame_time is not None:
+                frame_age = now - hub.last_frame_time
+                if frame_age < STREAM_STALE_SECONDS:
+                    self._failures.pop(cam_name, None)
+                    self._next_probe[cam_name] = now + HEALTH_INTERVAL_SECONDS
+                    update_camera_status(cam_name, {
+                        "status": "online",
+                        "last_check": datetime.now().isoformat(),
+                        "source": "stream",
+                        "fps": round(hub.capture_fps, 2),
+                        "last_frame_age": round(frame_age, 2)
+                    })
+                    continue
+
+            with self._lock:
+                if cam_name in self._in_flight or now < self._next_probe.get(cam_name, 0.0):
+                    continue
+                self._in_flight.add(cam_name)
+            self._executor.submit(self._probe, cam_name, cam_url)
+
+        # Forget cameras that were removed
+        for cam_name in set(self._next_probe) - set(cameras):
+            self._next_probe.pop(cam_name, None)
+            self._failures.pop(cam_name, None)
+
+    def _probe(self, cam_name, cam_url):
+        """GET the stream and read its first bytes; many MJPEG cams reject HEAD"""
+        started = time.monotonic()
+        try:
+            with self._session.get(cam_url, stream=True, timeout=HEALTH_PROBE_TIMEOUT) as response:
+                online = response.status_code == 200 and bool(next(response.iter_content(1024), b""))
+                status = {
+                    "status": "online" if online else "offline",
                     "last_check": datetime.now().isoformat(),
-                    "error": str(e)
+                    "source": "probe",
+                    "response_time": round(time.monotonic() - started, 3)
                 }
-        time.sleep(30)  # Check every 30 seconds
+                if not online:
+                    status["error"] = f"HTTP {response.status_code}"
+        except Exception as e:
+            online = False
+            status = {
+                "status": "offline",
+                "last_check": datetime.now().isoformat(),
+                "source": "probe",
+                "error": str(e)
+            }
+
+        with self._lock:
+            self._in_flight.discard(cam_name)
+            if online:
+                self._failures.pop(cam_name, None)
+                delay = HEALTH_INTERVAL_SECONDS
+            else:
+                failures = self._failures.get(cam_name, 0) + 1
+                self._failures[cam_name] = failures
+                delay = min(HEALTH_INTERVAL_SECONDS * 2 ** (failures - 1), HEALTH_MAX_BACKOFF_SECONDS)
+                status["failures"] = failures
+            self._next_probe[cam_name] = time.monotonic() + delay
+        if cam_name in CAMERAS:
+            update_camera_status(cam_name, status)
+
+
+health_monitor = HealthMonitor()
+
+
+class MotionDetector:
+    """Running-average motion detector working on a small grayscale proxy.
+
+    Frames are reduced to MOTION_PROXY_WIDTH pixels wide before analysis and
+    compared against an exponentially weighted background model rather than
+    the previous frame. Motion is a plain changed-pixel count inside the
+    optional ROI, scaled back to full-resolution pixels so that
+    motion_sensitivity keeps its original meaning.
+    """
 
-def detect_motion(frame1, frame2, threshold=500):
-    """Enhanced motion detection"""
+    def __init__(self, learning_rate=0.05, pixel_threshold=25):
+        self.learning_rate = learning_rate
+        self.pixel_threshold = pixel_threshold
+        self.last_area = 0.0
+        self.last_boxes = []
+        self._background = None
+        self._mask = None
+        self._mask_key = None
+
+    @staticmethod
+    def proxy_from_jpeg(jpg):
+        """Decode straight to a quarter-size grayscale proxy (DCT downscale)"""
+        small = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if small is None:
+            return None, 0
+        return MotionDetector._fit_proxy(small), small.shape[1] * 4
+
+    @staticmethod
+    def proxy_from_frame(frame, full_width=None):
+        """Build the grayscale proxy from an already decoded BGR frame.
+
+        full_width is the source width when the frame was decoded at a reduced
+        DCT scale, so areas stay in source pixels whatever the decode scale.
+        """
+        # Nearest-neighbour subsampling is ~50x cheaper than INTER_AREA on a
+        # full frame; the blur in update() absorbs the aliasing
+        small = MotionDetector._fit_proxy(frame, cv2.INTER_NEAREST)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), full_width or frame.shape[1]
+
+    @staticmethod
+    def _fit_proxy(image, interpolation=cv2.INTER_AREA):
+        height, width = image.shape[:2]
+        if width <= MOTION_PROXY_WIDTH:
+            return image
+        proxy_height = max(1, round(height * MOTION_PROXY_WIDTH / width))
+        return cv2.resize(image, (MOTION_PROXY_WIDTH, proxy_height), interpolation=interpolation)
+
+    def update(self, gray, full_width, sensitivity=500, roi=None):
+        """Feed one proxy frame; returns True if the changed area exceeds sensitivity"""
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            self.last_area = 0.0
+            return False
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+
+        mask = self._roi_mask(gray.shape, roi)
+        if mask is not None:
+            changed = cv2.bitwise_and(changed, mask)
+
+        scale = full_width / gray.shape[1]
+        self.last_area = cv2.countNonZero(changed) * scale * scale
+        if self.last_area <= sensitivity:
+            self.last_boxes = []
+            return False
+        self.last_boxes = self._boxes(changed)
+        return True
+
+    @staticmethod
+    def _boxes(changed):
+        """Bounding boxes of the changed regions as normalised [x, y, w, h]"""
+        height, width = changed.shape
+        contours, _ = cv2.findContours(changed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        rects = sorted((cv2.boundingRect(contour) for contour in contours),
+                       key=lambda rect: rect[2] * rect[3], reverse=True)
+        return [[round(x / width, 4), round(y / height, 4), round(w / width, 4), round(h / height, 4)]
+                for x, y, w, h in rects[:MOTION_MAX_BOXES] if w * h >= 4]
+
+    def _roi_mask(self, shape, roi):
+        """Rasterise ROI polygons given as normalised [x, y] points"""
+        if not roi:
+            return None
+        key = (shape, json.dumps(roi))
+        if key != self._mask_key:
+            height, width = shape
+            mask = np.zeros(shape, dtype=np.uint8)
+            polygons = [np.array([[x * width, y * height] for x, y in polygon], dtype=np.int32)
+                        for polygon in roi]
+            cv2.fillPoly(mask, polygons, 255)
+            self._mask, self._mask_key = mask, key
+        return self._mask
+
+
+class MJPEGParser:
+    """Incremental demuxer for multipart MJPEG streams.
+
+    Chunks are appended to a single bytearray and scanning resumes where it
+    stopped, so each byte is searched once and consumed data is only dropped
+    in bulk. When a part header carries Content-Length the frame is sliced
+    out directly; otherwise the JPEG SOI/EOI markers delimit it. feed()
+    returns every frame completed by the chunk, not just the first.
+    """
+
+    SOI = b'\xff\xd8'
+    EOI = b'\xff\xd9'
+    _CONTENT_LENGTH = re.compile(rb'content-length\s*:\s*(\d+)', re.IGNORECASE)
+
+    def __init__(self, max_frame_size=16 * 1024 * 1024):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._pos = 0        # start of unconsumed data
+        self._scan = 0       # where the next marker search resumes
+        self._start = -1     # SOI offset of the frame in progress
+        self._length = None  # Content-Length of the frame in progress
+
+    def feed(self, chunk):
+        """Append a chunk and return the list of complete JPEG frames"""
+        buf = self._buffer
+        buf += chunk
+        frames = []
+        view = memoryview(buf)
+        try:
+            while True:
+                if self._start < 0:
+                    start = buf.find(self.SOI, self._scan)
+                    if start < 0:
+                        # Keep a possible half marker and the part headers
+                        self._scan = max(self._scan, len(buf) - 1)
+                        if self._scan - self._pos > 1024:
+                            self._pos = self._scan
+                        break
+                    self._start = start
+                    self._length = self._part_length(view[self._pos:start])
+                    self._scan = start + 2
+
+                start = self._start
+                if self._length is not None:
+                    end = start + self._length
+                    if end > len(buf):
+                        break
+                    if view[end - 2:end] != self.EOI:
+                        # Length includes trailing bytes or is wrong; fall back to markers
+                        self._length = None
+                        continue
+                else:
+                    eoi = buf.find(self.EOI, self._scan)
+                    if eoi < 0:
+                        self._scan = max(self._scan, len(buf) - 1)
+                        if len(buf) - start > self.max_frame_size:
+                            # Garbage or a truncated frame; resynchronise
+                            self._pos = self._scan = len(buf)
+                            self._start = -1
+                        break
+                    end = eoi + 2
+
+                frames.append(bytes(view[start:end]))
+                self._pos = self._scan = end
+                self._start = -1
+                self._length = None
+        finally:
+            view.release()
+
+        # Drop consumed bytes in bulk rather than on every frame
+        if self._pos and (self._pos == len(buf) or self._pos > 65536):
+            del buf[:self._pos]
+            self._scan -= self._pos
+            if self._start >= 0:
+                self._start -= self._pos
+            self._pos = 0
+        return frames
+
+    def _part_length(self, header):
+        if len(header) > 1024:
+            return None
+        match = self._CONTENT_LENGTH.search(header)
+        return int(match.group(1)) if match else None
+
+
+class LatencyHistogram:
+    """Prometheus-style latency histogram with fixed buckets.
+
+    observe() is a bisect and three additions. Each camera's stages are
+    only ever timed by one thread at a time (the ingest loop or its single
+    in-flight pixel job), so no lock is taken.
+    """
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def snapshot(self):
+        return list(self.counts), self.sum, self.count
+
+    def load(self, snapshot):
+        counts, self.sum, self.count = snapshot
+        self.counts = list(counts)
+
+
+class FrameSubscriber:
+    """Bounded latest-frame slot for a single viewer.
+
+    Only the newest frame is kept; if the viewer has not consumed the previous
+    one yet it is overwritten and counted as dropped, so a slow client skips
+    frames instead of holding up the ingest worker or other viewers. Lives on
+    the event loop: a waiting viewer costs a coroutine, not a thread.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+        self._frame = None
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, frame_bytes):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame_bytes
+        self._event.set()
+
+    async def get(self, timeout=None):
+        """Wait for and take the latest frame (None on timeout or close)"""
+        if self._frame is None and not self.closed:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._event.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+
+async def read_http_stream(url: str, timeout=STREAM_READ_TIMEOUT, chunk_size=65536):
+    """Minimal asyncio HTTP/1.1 GET yielding body chunks as they arrive.
+
+    Supports plain and TLS connections, basic auth in the URL, redirects and
+    chunked transfer encoding, which covers the IP cameras we talk to without
+    holding a thread per stream. Proxy environment variables are not used.
+    """
+    reader, writer, chunked = await _open_http_stream(url, timeout)
     try:
-        diff = cv2.absdiff(frame1, frame2)
-        gray = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        _, thresh = cv2.threshold(blur, 20, 255, cv2.THRESH_BINARY)
-        dilated = cv2.dilate(thresh, None, iterations=3)
-        contours, _ = cv2.findContours(dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
-        motion_area = sum(cv2.contourArea(contour) for contour in contours)
-        return motion_area > threshold
-    except Exception:
-        return False
-
-def generate_frames(camera_url: str, camera_name: str = None):
-    previous_frame = None
-    recording = False
-    video_writer = None
-    
+        while True:
+            if chunked:
+                size_line = await asyncio.wait_for(reader.readline(), timeout)
+                size = int(size_line.split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    return
+                data = await asyncio.wait_for(reader.readexactly(size + 2), timeout)
+                yield data[:-2]
+            else:
+                data = await asyncio.wait_for(reader.read(chunk_size), timeout)
+                if not data:
+                    return
+                yield data
+    finally:
+        writer.close()
+
+
+async def _open_http_stream(url, timeout):
+    """Send the GET, following up to STREAM_MAX_REDIRECTS redirects.
+
+    Returns (reader, writer, chunked) positioned at the start of the body.
+    Credentials are kept across a redirect only while the host is unchanged.
+    """
+    for _ in range(STREAM_MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if secure else None),
+            timeout)
+        try:
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            headers = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc.rpartition('@')[2]}",
+                       "User-Agent: cctv-monitor", "Accept: */*", "Connection: close"]
+            if parts.username:
+                credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+                headers.append("Authorization: Basic " + base64.b64encode(credentials.encode()).decode())
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            status = status_line.split(None, 2)
+            code = status[1] if len(status) >= 2 else b""
+            chunked = False
+            location = None
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                name = name.strip().lower()
+                if name == "transfer-encoding" and "chunked" in value.lower():
+                    chunked = True
+                elif name == "location":
+                    location = value.strip()
+        except BaseException:
+            writer.close()
+            raise
+        if code == b"200":
+            return reader, writer, chunked
+        writer.close()
+        if code not in (b"301", b"302", b"303", b"307", b"308") or not location:
+            raise RuntimeError(f"HTTP {status_line.decode('latin-1').strip() or 'no response'}")
+        target = urljoin(url, location)
+        target_parts = urlsplit(target)
+        if target_parts.hostname == parts.hostname and parts.username and not target_parts.username:
+            target = target_parts._replace(netloc=f"{parts.netloc.rpartition('@')[0]}@{target_parts.netloc}").geturl()
+        url = target
+    raise RuntimeError(f"Too many redirects (more than {STREAM_MAX_REDIRECTS})")
+
+
+class RecordingsIndex:
+    """Persistent SQLite catalog of recording segments and motion events.
+
+    Writers upsert a row when a segment opens and again when it closes, so
+    listing recordings never has to open the video files. sync() reconciles
+    the table with the directory using only mtime/size, probing a file with
+    OpenCV only when it is new or has changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        # camera -> [bytes, segments], kept current by upsert() and remove()
+        self._usage = {}
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    filename TEXT PRIMARY KEY,
+                    camera TEXT NOT NULL,
+                    start_time REAL NOT NULL,
+                    end_time REAL NOT NULL,
+                    duration REAL NOT NULL,
+                    fps REAL NOT NULL,
+                    frames INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS recordings_camera_start ON recordings (camera, start_time);
+                CREATE INDEX IF NOT EXISTS recordings_start ON recordings (start_time);
+                CREATE TABLE IF NOT EXISTS motion_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    camera TEXT NOT NULL,
+                    start_time REAL NOT NULL,
+                    end_time REAL NOT NULL,
+                    peak_area REAL NOT NULL,
+                    boxes TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS motion_events_camera_start ON motion_events (camera, start_time);
+                CREATE INDEX IF NOT EXISTS motion_events_start ON motion_events (start_time);
+            """)
+            self._usage = {row[0]: [row[1], row[2]] for row in self._conn.execute(
+                "SELECT camera, SUM(size), COUNT(*) FROM recordings GROUP BY camera")}
+        return self._conn
+
+    def _account(self, camera, size, segments):
+        usage = self._usage.setdefault(camera, [0, 0])
+        usage[0] += size
+        usage[1] += segments
+        if usage[1] <= 0:
+            del self._usage[camera]
+
+    def upsert(self, filename, camera, start_time, end_time, fps, frames, size=None, mtime=None):
+        """Insert or update a segment; size/mtime are read from disk if omitted"""
+        if size is None or mtime is None:
+            try:
+                stat = os.stat(os.path.join(RECORDINGS_DIR, filename))
+                size, mtime = stat.st_size, stat.st_mtime
+            except OSError:
+                size, mtime = 0, 0.0
+        duration = frames / fps if fps > 0 else 0.0
+        with self._lock:
+            db = self._db()
+            old = db.execute("SELECT camera, size FROM recordings WHERE filename = ?", (filename,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO recordings "
+                "(filename, camera, start_time, end_time, duration, fps, frames, size, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (filename, camera, start_time, end_time, duration, fps, frames, size, mtime))
+            db.commit()
+            if old is not None:
+                self._account(old["camera"], -old["size"], -1)
+            self._account(camera, size, 1)
+
+    def remove(self, filename):
+        with self._lock:
+            db = self._db()
+            old = db.execute("SELECT camera, size FROM recordings WHERE filename = ?", (filename,)).fetchone()
+            db.execute("DELETE FROM recordings WHERE filename = ?", (filename,))
+            db.commit()
+            if old is not None:
+                self._account(old["camera"], -old["size"], -1)
+
+    def usage(self):
+        """Indexed bytes and segment count per camera, without touching the disk"""
+        with self._lock:
+            self._db()
+            return {camera: {"bytes": usage[0], "segments": usage[1]} for camera, usage in self._usage.items()}
+
+    def oldest(self, camera=None, before=None, limit=RETENTION_BATCH):
+        """Oldest segments first, optionally for one camera or ending before a time"""
+        clauses, params = [], []
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if before is not None:
+            clauses.append("end_time < ?")
+            params.append(before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT filename, camera, size, start_time, end_time FROM recordings{where} "
+                f"ORDER BY start_time LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, filename):
+        with self._lock:
+            row = self._db().execute("SELECT * FROM recordings WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def query(self, camera=None, start=None, end=None, min_duration=None, max_duration=None,
+              limit=None, offset=0):
+        """Return (total, rows) for segments overlapping [start, end], newest first"""
+        clauses, params = [], []
+        if camera:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if start is not None:
+            clauses.append("end_time >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("start_time <= ?")
+            params.append(end)
+        if min_duration is not None:
+            clauses.append("duration >= ?")
+            params.append(min_duration)
+        if max_duration is not None:
+            clauses.append("duration <= ?")
+            params.append(max_duration)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        page = " LIMIT ? OFFSET ?" if limit is not None else ""
+        page_params = [limit, offset] if limit is not None else []
+        with self._lock:
+            db = self._db()
+            total = db.execute(f"SELECT COUNT(*) FROM recordings{where}", params).fetchone()[0]
+            rows = db.execute(f"SELECT * FROM recordings{where} ORDER BY start_time DESC{page}",
+                              params + page_params).fetchall()
+        return total, [dict(row) for row in rows]
+
+    def covering(self, camera, start_time, end_time):
+        """The segment to play for [start_time, end_time]: the one recording at
+        start_time, else the first one starting inside the range"""
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT * FROM recordings WHERE camera = ? AND start_time <= ? "
+                             "ORDER BY start_time DESC LIMIT 1", (camera, start_time)).fetchone()
+            # end_time is the last frame's time, so allow for one frame interval
+            if row is None or row["end_time"] + 1.0 < start_time:
+                row = db.execute("SELECT * FROM recordings WHERE camera = ? AND start_time > ? "
+                                 "AND start_time <= ? ORDER BY start_time LIMIT 1",
+                                 (camera, start_time, end_time)).fetchone()
+        return dict(row) if row else None
+
+    def add_motion_event(self, camera, start_time, end_time, peak_area, boxes):
+        """Append a finished motion event; events are never updated"""
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                "INSERT INTO motion_events (camera, start_time, end_time, peak_area, boxes) VALUES (?, ?, ?, ?, ?)",
+                (camera, start_time, end_time, peak_area, json.dumps(boxes)))
+            db.commit()
+        return cursor.lastrowid
+
+    def query_motion_events(self, camera=None, start=None, end=None, limit=None, offset=0):
+        """Return (total, rows) for motion events overlapping [start, end], oldest first"""
+        clauses, params = [], []
+        if camera:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if start is not None:
+            clauses.append("end_time >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("start_time <= ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        page = " LIMIT ? OFFSET ?" if limit is not None else ""
+        page_params = [limit, offset] if limit is not None else []
+        with self._lock:
+            db = self._db()
+            total = db.execute(f"SELECT COUNT(*) FROM motion_events{where}", params).fetchone()[0]
+            rows = db.execute(f"SELECT * FROM motion_events{where} ORDER BY start_time{page}",
+                              params + page_params).fetchall()
+        events = []
+        for row in rows:
+            event = dict(row)
+            event["boxes"] = json.loads(event["boxes"])
+            events.append(event)
+        return total, events
+
+    def sync(self, skip=()):
+        """Reconcile the index with the recordings directory"""
+        with self._lock:
+            known = {row["filename"]: (row["size"], row["mtime"])
+                     for row in self._db().execute("SELECT filename, size, mtime FROM recordings")}
+        seen = set()
+        for entry in os.scandir(RECORDINGS_DIR):
+            if not entry.name.endswith(".mp4") or entry.name in skip:
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            if known.get(entry.name) == (stat.st_size, stat.st_mtime):
+                continue
+            self._probe(entry.name, entry.path, stat)
+        for filename in set(known) - seen - set(skip):
+            self.remove(filename)
+
+    def _probe(self, filename, path, stat):
+        fps, frames = 0.0, 0
+        try:
+            cap = cv2.VideoCapture(path)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            cap.release()
+        except Exception as e:
+            print(f"Error probing recording {filename}: {e}")
+        camera, start_time = parse_recording_filename(filename, stat.st_mtime)
+        duration = frames / fps if fps > 0 else 0.0
+        self.upsert(filename, camera, start_time, start_time + duration, fps, frames,
+                    stat.st_size, stat.st_mtime)
+
+
+def parse_recording_filename(filename: str, fallback_time: float):
+    """Split '<camera>_<YYYYmmdd>_<HHMMSS>.mp4' into (camera, start timestamp)"""
+    parts = filename[:-len(".mp4")].rsplit("_", 2)
+    if len(parts) == 3:
+        try:
+            return parts[0], datetime.strptime(f"{parts[1]}_{parts[2]}", "%Y%m%d_%H%M%S").timestamp()
+        except ValueError:
+            pass
+    return filename.split("_")[0], fallback_time
+
+
+def parse_time_param(value):
+    """Parse an API time parameter given as epoch seconds or ISO 8601"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time value: {value}")
+
+
+def format_duration(duration_seconds: float):
+    hours = int(duration_seconds // 3600)
+    minutes = int((duration_seconds % 3600) // 60)
+    seconds = int(duration_seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+recordings_index = RecordingsIndex(os.path.join(RECORDINGS_DIR, "index.db"))
+
+
+def thumbnail_paths(filename: str):
+    """Paths of the (thumbnail, sprite strip) JPEGs for a recording"""
+    stem = os.path.splitext(filename)[0]
+    return (os.path.join(THUMBNAILS_DIR, f"{stem}.jpg"),
+            os.path.join(THUMBNAILS_DIR, f"{stem}_sprite.jpg"))
+
+def make_thumbnail(frame):
+    height, width = frame.shape[:2]
+    thumb_width = max(1, int(THUMBNAIL_HEIGHT * width / height))
+    return cv2.resize(frame, (thumb_width, THUMBNAIL_HEIGHT), interpolation=cv2.INTER_AREA)
+
+def save_thumbnails(filename: str, thumbnail, sprite_tiles):
+    """Write a recording's thumbnail and sprite strip next to each other"""
+    thumb_path, sprite_path = thumbnail_paths(filename)
+    params = [cv2.IMWRITE_JPEG_QUALITY, 80]
+    if thumbnail is not None:
+        cv2.imwrite(thumb_path, thumbnail, params)
+    if sprite_tiles:
+        cv2.imwrite(sprite_path, np.hstack(sprite_tiles), params)
+
+
+class ThumbnailBackfill:
+    """Bounded background worker that generates missing thumbnails.
+
+    Requests for a thumbnail that was never written (recordings made before
+    thumbnails existed, or copied in by hand) enqueue the file here instead
+    of decoding video on the request thread. Duplicate and overflow requests
+    are ignored; the client simply asks again later.
+    """
+
+    def __init__(self, max_pending=64):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="thumbnail-backfill", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def request(self, filename: str):
+        with self._lock:
+            if filename in self._pending:
+                return
+            try:
+                self.queue.put_nowait(filename)
+            except queue.Full:
+                return
+            self._pending.add(filename)
+
+    def _run(self):
+        while True:
+            filename = self.queue.get()
+            try:
+                self._generate(filename)
+            except Exception as e:
+                print(f"Error generating thumbnail for {filename}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(filename)
+
+    def _generate(self, filename):
+        cap = cv2.VideoCapture(os.path.join(RECORDINGS_DIR, filename))
+        try:
+            if not cap.isOpened():
+                return
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            ret, frame = cap.read()
+            if not ret:
+                return
+            thumbnail = make_thumbnail(frame)
+            tiles = [thumbnail]
+            step = frame_count // SPRITE_FRAMES
+            for i in range(1, SPRITE_FRAMES if step > 0 else 0):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, i * step)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                tiles.append(make_thumbnail(frame))
+            save_thumbnails(filename, thumbnail, tiles)
+        finally:
+            cap.release()
+
+
+thumbnail_backfill = ThumbnailBackfill()
+
+
+def store_motion_event(camera, start_time, end_time, peak_area, boxes):
+    try:
+        recordings_index.add_motion_event(camera, start_time, end_time, peak_area, boxes)
+    except Exception as e:
+        print(f"Error storing motion event for {camera}: {e}")
+
+def delete_recording_files(filename: str):
+    """Remove a recording file, its index row and its thumbnails"""
+    try:
+        os.remove(os.path.join(RECORDINGS_DIR, filename))
+    except FileNotFoundError:
+        pass
+    recordings_index.remove(filename)
+    for path in thumbnail_paths(filename):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class RetentionManager:
+    """Background pruning of recordings against disk budgets.
+
+    Usage comes from the running per-camera byte counts the index keeps as
+    segments open, close and are deleted, so a pass is a few dictionary
+    lookups plus indexed oldest-first queries for budgets that are actually
+    exceeded; the recordings directory is never scanned. Budgets are
+    enforced in order: max age, per-camera bytes, global bytes, minimum
+    free disk space. Segments still being written are never pruned.
+    """
+
+    def __init__(self):
+        self.pruned_segments = 0
+        self.pruned_bytes = 0
+        self.last_pass = None
+        self._active = set()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def notify(self):
+        """Re-check budgets soon, e.g. after a segment closed"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(RETENTION_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"Retention error: {e}")
+
+    def enforce(self):
+        self._active = {hub.writer.current_file for hub in list(camera_hubs.values()) if hub.writer is not None}
+        now = time.time()
+        for camera in list(recordings_index.usage()):
+            max_age = get_camera_setting(camera, "retention_max_age_days") or RETENTION_MAX_AGE_DAYS
+            if max_age:
+                self._prune(lambda: True, "age", camera=camera, before=now - float(max_age) * 86400)
+            max_bytes = get_camera_setting(camera, "retention_max_bytes")
+            if max_bytes:
+                self._prune(lambda: recordings_index.usage().get(camera, {}).get("bytes", 0) > int(max_bytes),
+                            "camera budget", camera=camera)
+        if RETENTION_MAX_BYTES:
+            self._prune(lambda: sum(usage["bytes"] for usage in recordings_index.usage().values())
+                        > RETENTION_MAX_BYTES, "global budget")
+        if RETENTION_MIN_FREE_BYTES:
+            self._prune(lambda: shutil.disk_usage(RECORDINGS_DIR).free < RETENTION_MIN_FREE_BYTES, "low disk")
+        self.last_pass = now
+        system_stats["data_usage"] = data_usage_report()
+
+    def _prune(self, over, reason, camera=None, before=None):
+        """Delete oldest-first batches while over() holds"""
+        while over():
+            removed = 0
+            for row in recordings_index.oldest(camera, before):
+                if row["filename"] in self._active:
+                    continue
+                if removed and not over():
+                    return
+                delete_recording_files(row["filename"])
+                self.pruned_segments += 1
+                self.pruned_bytes += row["size"]
+                removed += 1
+                print(f"Retention ({reason}): deleted {row['filename']}")
+            if not removed:
+                return
+
+
+def data_usage_report():
+    """Recording storage per camera against budgets, plus disk space"""
+    usage = recordings_index.usage()
+    disk = shutil.disk_usage(RECORDINGS_DIR)
+    cameras = {}
+    for camera in sorted(set(usage) | set(CAMERAS)):
+        cameras[camera] = {
+            "bytes": usage.get(camera, {}).get("bytes", 0),
+            "segments": usage.get(camera, {}).get("segments", 0),
+            "max_bytes": get_camera_setting(camera, "retention_max_bytes"),
+            "max_age_days": get_camera_setting(camera, "retention_max_age_days") or RETENTION_MAX_AGE_DAYS or None
+        }
+    return {
+        "total_bytes": sum(entry["bytes"] for entry in usage.values()),
+        "total_segments": sum(entry["segments"] for entry in usage.values()),
+        "cameras": cameras,
+        "max_bytes": RETENTION_MAX_BYTES or None,
+        "min_free_bytes": RETENTION_MIN_FREE_BYTES or None,
+        "disk_free_bytes": disk.free,
+        "disk_total_bytes": disk.total,
+        "pruned_segments": retention_manager.pruned_segments,
+        "pruned_bytes": retention_manager.pruned_bytes,
+        "last_retention_pass": datetime.fromtimestamp(retention_manager.last_pass).isoformat()
+        if retention_manager.last_pass else None
+    }
+
+
+retention_manager = RetentionManager()
+
+
+class RecordingWriter:
+    """Background MP4 writer for one camera.
+
+    The ingest worker hands over compressed JPEG frames through a bounded
+    queue and never waits on disk I/O: when the queue is full the frame is
+    dropped and counted. The writer thread decodes, writes fixed-length
+    segments that rotate on wall-clock boundaries, and opens each segment at
+    the camera's measured capture fps. Switching between the adaptive idle
+    rate and the full rate also starts a new segment.
+    """
+
+    def __init__(self, camera_name: str, max_queue=RECORDING_QUEUE_FRAMES):
+        self.camera_name = camera_name
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.segments = 0
+        self.current_file = None
+        self.current_fps = None
+        self._closing = threading.Event()
+        self._writer = None
+        self._frame_size = None
+        self._segment_end = 0.0
+        self._segment_start = self._segment_last = 0.0
+        self._segment_frames = 0
+        self._segment_idle = False
+        self._name_second = 0
+        self._pending = []
+        self._thumbnail = None
+        self._sprite_tiles = []
+        self._sprite_step = 1
+        self._thread = threading.Thread(target=self._run, name=f"recorder-{camera_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def submit(self, jpg, timestamp, fps, idle=False):
+        """Queue one frame without blocking; returns False if it was dropped"""
+        try:
+            self.queue.put_nowait((jpg, timestamp, fps, idle))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        """Finish the queued frames and release the file in the background"""
+        self._closing.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "file": self.current_file,
+            "fps": self.current_fps,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "segments": self.segments
+        }
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    jpg, timestamp, fps, idle = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    if self._closing.is_set():
+                        break
+                    continue
+                try:
+                    self._accept(jpg, timestamp, fps, idle)
+                except Exception as e:
+                    print(f"Recording error ({self.camera_name}):", e)
+        finally:
+            try:
+                self._flush_pending()
+            except Exception as e:
+                print(f"Recording error ({self.camera_name}):", e)
+            self._close_segment()
+
+    def _accept(self, jpg, timestamp, fps, idle):
+        if not fps and self._writer is None:
+            # Capture rate not measured yet (recording started within the
+            # camera's first second): hold frames until the hub measures it
+            self._pending.append((jpg, timestamp, idle))
+            if timestamp - self._pending[0][1] >= RECORDING_FPS_WAIT_SECONDS:
+                self._flush_pending()
+            return
+        self._flush_pending(fps)
+        self._write(jpg, timestamp, fps, idle)
+
+    def _flush_pending(self, fps=None):
+        """Write held frames at fps, or at the rate their timestamps show"""
+        if not self._pending:
+            return
+        frames, self._pending = self._pending, []
+        if not fps:
+            # Median interval, taken over strides of a few frames because frames
+            # often arrive in bursts; count/span is skewed by the partial bursts
+            # at either end
+            stride = max(1, min(5, len(frames) // 2))
+            intervals = sorted((frames[i + stride][1] - frames[i][1]) / stride
+                               for i in range(len(frames) - stride))
+            interval = intervals[len(intervals) // 2] if intervals else 0.0
+            fps = 1.0 / interval if interval > 0 else 1.0
+        for jpg, timestamp, idle in frames:
+            self._write(jpg, timestamp, fps, idle)
+
+    def _write(self, jpg, timestamp, fps, idle):
+        frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return
+        frame_size = (frame.shape[1], frame.shape[0])
+        if self._writer is None or timestamp >= self._segment_end or frame_size != self._frame_size \
+                or self._rate_changed(idle):
+            self._open_segment(timestamp, fps, frame_size, idle)
+        if self._writer.isOpened():
+            self._writer.write(frame)
+            self.frames_written += 1
+            self._segment_frames += 1
+            self._segment_last = timestamp
+            if (self._segment_frames - 1) % self._sprite_step == 0:
+                # Keep every k-th frame, doubling k whenever the buffer fills,
+                # so tiles span the frames actually written however short the clip
+                tile = make_thumbnail(frame)
+                if self._thumbnail is None:
+                    self._thumbnail = tile
+                self._sprite_tiles.append(tile)
+                if len(self._sprite_tiles) >= 2 * SPRITE_FRAMES:
+                    self._sprite_tiles = self._sprite_tiles[::2]
+                    self._sprite_step *= 2
+
+    def _rate_changed(self, idle):
+        """Entering or leaving the adaptive idle rate needs a new segment,
+        since an MP4 has one fixed rate"""
+        return idle != self._segment_idle
+
+    def _open_segment(self, timestamp, fps, frame_size, idle):
+        self._close_segment()
+        segment_seconds = max(1, int(get_camera_setting(self.camera_name, "segment_seconds")))
+        # Align segments to wall-clock multiples of segment_seconds
+        self._segment_end = (timestamp // segment_seconds + 1) * segment_seconds
+        # File names have one-second resolution: a segment opened in the same
+        # second as the previous one is named for the next second
+        self._name_second = max(int(timestamp), self._name_second + 1)
+        name = datetime.fromtimestamp(self._name_second).strftime("%Y%m%d_%H%M%S")
+        self.current_file = f"{self.camera_name}_{name}.mp4"
+        self.current_fps = round(min(max(fps or self.current_fps or 1.0, 1.0), 60.0), 2)
+        self._segment_start = self._segment_last = timestamp
+        self._segment_frames = 0
+        self._segment_idle = idle
+        self._thumbnail = None
+        self._sprite_tiles = []
+        self._sprite_step = 1
+        self._frame_size = frame_size
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self._writer = cv2.VideoWriter(os.path.join(RECORDINGS_DIR, self.current_file),
+                                       fourcc, self.current_fps, frame_size)
+        if not self._writer.isOpened():
+            print(f"Recording error ({self.camera_name}): cannot open {self.current_file}")
+        self.segments += 1
+        system_stats["total_recordings"] += 1
+        self._index_segment()
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._index_segment()
+            try:
+                tiles = self._sprite_tiles
+                if len(tiles) > SPRITE_FRAMES:
+                    tiles = [tiles[i * len(tiles) // SPRITE_FRAMES] for i in range(SPRITE_FRAMES)]
+                save_thumbnails(self.current_file, self._thumbnail, tiles)
+            except Exception as e:
+                print(f"Error writing thumbnails for {self.current_file}: {e}")
+            retention_manager.notify()
+        self._writer = None
+        self.current_file = None
+
+    def _index_segment(self):
+        try:
+            recordings_index.upsert(self.current_file, self.camera_name, self._segment_start,
+                                    self._segment_last, self.current_fps, self._segment_frames)
+        except Exception as e:
+            print(f"Error indexing recording {self.current_file}: {e}")
+
+
+class PreRollBuffer:
+    """Ring of the most recent compressed frames for motion pre-roll.
+
+    Holds references to the camera's own JPEG bytes (no decoded arrays) and
+    evicts oldest-first once either the time window or the byte cap is
+    exceeded, so memory per camera is bounded by pre_roll_max_bytes.
+    """
+
+    def __init__(self):
+        self._frames = deque()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def append(self, jpg, timestamp, fps, max_seconds, max_bytes):
+        self._frames.append((jpg, timestamp, fps))
+        self.bytes += len(jpg)
+        while self._frames and (self.bytes > max_bytes or timestamp - self._frames[0][1] > max_seconds):
+            self.bytes -= len(self._frames.popleft()[0])
+
+    def drain(self):
+        """Remove and return all buffered (jpg, timestamp, fps) entries, oldest first"""
+        frames = list(self._frames)
+        self.clear()
+        return frames
+
+    def clear(self):
+        self._frames.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            "frames": len(self._frames),
+            "bytes": self.bytes,
+            "seconds": round(self._frames[-1][1] - self._frames[0][1], 2) if self._frames else 0
+        }
+
+
+def resize_jpeg(jpg, width=None, height=None, quality=None):
+    """Re-encode a JPEG to fit within width x height, keeping aspect ratio"""
+    frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return jpg
+    scale = min(width / frame.shape[1] if width else 1.0, height / frame.shape[0] if height else 1.0)
+    if scale < 1.0:
+        size = (max(1, int(frame.shape[1] * scale)), max(1, int(frame.shape[0] * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality or 90)])
+    return buffer.tobytes() if ret else jpg
+
+def draw_overlay(frame, timestamp, recording):
+    """Burn the timestamp and, while recording, the REC marker into a frame"""
+    scale = max(0.35, min(1.0, frame.shape[1] / 640))
+    cv2.putText(frame, timestamp, (10, int(30 * scale)), cv2.FONT_HERSHEY_SIMPLEX, 0.7 * scale, (0, 255, 0),
+                max(1, round(2 * scale)))
+    if recording:
+        cv2.circle(frame, (frame.shape[1] - int(30 * scale), int(30 * scale)), int(10 * scale), (0, 0, 255), -1)
+        cv2.putText(frame, "REC", (frame.shape[1] - int(60 * scale), int(35 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5 * scale, (0, 0, 255), max(1, round(2 * scale)))
+
+
+class CameraHub:
+    """Long-lived ingest task for one camera.
+
+    Holds a single upstream connection and fans frames out to any number of
+    subscribers. Passthrough viewers get the camera's JPEG bytes untouched.
+    Overlay viewers pick a stream profile; each frame is decoded once and
+    every profile that has viewers and is due under its fps cap is resized,
+    annotated and encoded once, then shared by all of that profile's
+    viewers. Frames are only decoded when overlay viewers or a due motion
+    check need the pixels.
+
+    Network I/O and fan-out run on the event loop. Pixel work is handed to
+    the shared frame executor with at most one job in flight per camera; if
+    the previous job is still running the frame is skipped for pixel work
+    (passthrough viewers and recording still get it).
+    """
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.latest_jpeg = None
+        self.latest_jpeg_time = None
+        self.frame_count = 0
+        self.decoded_count = 0
+        self.skipped_count = 0
+        self.bytes_received = 0
+        self.reconnects = 0
+        self.last_error = None
+        # Frames too large for a worker's shared-memory ring slot (worker mode)
+        self.frames_oversize = 0
+        self.stage_latency = {stage: LatencyHistogram() for stage in FRAME_STAGES}
+        # Frames dropped by viewers that have since left, per channel
+        self.closed_drops = {}
+        self._snapshot_cache = {}
+        self.capture_fps = 0.0
+        self.writer = None
+        self.recording_trigger = None
+        self.pre_roll = PreRollBuffer()
+        self._motion_record_until = 0.0
+        self._last_motion_event = 0.0
+        # Adaptive rate: idle once no motion for idle_after_seconds, and what it saved
+        self.idle = False
+        self._last_motion_time = time.monotonic()
+        self._passthrough_sent = 0.0
+        self._next_record_due = 0.0
+        self._profile_size = {}
+        self.stream_bytes_sent = 0
+        self.stream_frames_saved = 0
+        self.stream_bytes_saved = 0
+        self.record_frames_saved = 0
+        self.record_bytes_saved = 0
+        # Motion event being accumulated: start/last hit (wall clock), peak area and boxes
+        self._motion_event = None
+        self._motion_event_lock = threading.Lock()
+        self.last_frame_time = None
+        self._fps_window_start = None
+        self._fps_window_frames = 0
+        # "passthrough" or "overlay:<profile>" -> subscribers
+        self._subscribers = {"passthrough": set()}
+        self._profile_sent = {}
+        self.source_width = None
+        self._motion = MotionDetector()
+        self._next_motion_check = 0.0
+        self._pixel_job = None
+        self._task = None
+
+    def start(self):
+        """Start ingesting; must be called on the event loop"""
+        self._task = asyncio.get_running_loop().create_task(self._run(), name=f"ingest-{self.name}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._stop_recording()
+        self._close_motion_event(force=True)
+        subscribers = [s for group in self._subscribers.values() for s in group]
+        for group in self._subscribers.values():
+            group.clear()
+        for subscriber in subscribers:
+            subscriber.close()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def viewer_count(self):
+        return sum(len(group) for group in self._subscribers.values())
+
+    def subscribe(self, mode="overlay", profile="full"):
+        subscriber = FrameSubscriber()
+        channel = "passthrough" if mode == "passthrough" else f"overlay:{profile}"
+        self._subscribers.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for channel, group in self._subscribers.items():
+            if subscriber in group:
+                group.discard(subscriber)
+                self.closed_drops[channel] = self.closed_drops.get(channel, 0) + subscriber.dropped
+        subscriber.close()
+
+    def loop_state(self, now=None):
+        """Frame-loop state for /api/health"""
+        now = time.monotonic() if now is None else now
+        age = now - self.last_frame_time if self.last_frame_time is not None else None
+        if not self.running:
+            state = "stopped"
+        elif age is None:
+            state = "connecting"
+        elif age > STREAM_STALE_SECONDS:
+            state = "stale"
+        else:
+            state = "streaming"
+        return {
+            "state": state,
+            "last_frame_age": round(age, 2) if age is not None else None,
+            "capture_fps": round(self.capture_fps, 2),
+            "frames": self.frame_count,
+            "decoded": self.decoded_count,
+            "skipped": self.skipped_count,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "frames_oversize": self.frames_oversize,
+            "viewers": self.viewer_count,
+            "pixel_job_busy": self._pixel_job is not None and not self._pixel_job.done(),
+            "recording": self.recording_trigger,
+            "rate": self.rate_stats()
+        }
+
+    def metrics_snapshot(self):
+        """Ingest-side counters and stage histograms as plain values"""
+        return {
+            "bytes_received": self.bytes_received,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "decoded": self.decoded_count,
+            "skipped": self.skipped_count,
+            "oversize": self.frames_oversize,
+            "stream_saved": (self.stream_frames_saved, self.stream_bytes_saved),
+            "stages": {stage: histogram.snapshot() for stage, histogram in self.stage_latency.items()}
+        }
+
+    async def stream(self, mode="overlay", profile="full"):
+        """Multipart MJPEG generator for a single viewer"""
+        subscriber = self.subscribe(mode, profile)
+        try:
+            while not subscriber.closed:
+                frame_bytes = await subscriber.get(timeout=1.0)
+                if frame_bytes is None:
+                    continue
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def snapshot(self, width=None, height=None, quality=None):
+        """Latest frame as (sequence, capture time, JPEG), resized if asked.
+
+        The unmodified camera JPEG is returned as-is; resized variants are
+        encoded on the frame executor once per source frame and cached.
+        """
+        seq, captured, jpg = self.frame_count, self.latest_jpeg_time, self.latest_jpeg
+        if jpg is None or not (width or height or quality):
+            return seq, captured, jpg
+        key = (width, height, quality)
+        cached = self._snapshot_cache.get(key)
+        if cached is not None and cached[0] == seq:
+            return seq, captured, cached[1]
+        resized = await asyncio.get_running_loop().run_in_executor(
+            frame_executor, resize_jpeg, jpg, width, height, quality)
+        if len(self._snapshot_cache) >= 8:
+            self._snapshot_cache.clear()
+        self._snapshot_cache[key] = (seq, resized)
+        return seq, captured, resized
+
+    def latest_decoded(self):
+        """Newest decoded frame when a worker publishes them, else None"""
+        return None
+
+    def _publish(self, channel, frame_bytes):
+        subscribers = list(self._subscribers.get(channel, ()))
+        self.stream_bytes_sent += len(frame_bytes) * len(subscribers)
+        for subscriber in subscribers:
+            subscriber.put(frame_bytes)
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    parser = MJPEGParser()
+                    parse_latency = self.stage_latency["parse"]
+                    async for chunk in read_http_stream(self.url):
+                        self.bytes_received += len(chunk)
+                        started = time.perf_counter()
+                        frames = parser.feed(chunk)
+                        parse_latency.observe(time.perf_counter() - started)
+                        for jpg in frames:
+                            self._process_jpeg(jpg)
+                    raise RuntimeError("stream ended")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Camera stream error ({self.url}):", e)
+                    self.reconnects += 1
+                    self.last_error = str(e) or type(e).__name__
+                self._fps_window_start = None
+                await asyncio.sleep(5)
+        finally:
+            self._stop_recording()
+
+    def _process_jpeg(self, jpg):
+        now = self._track_frame(jpg)
+        self._update_recording(jpg, now)
+        if self._motion_event is not None:
+            self._close_motion_event()
+        self._schedule_pixels(jpg, now)
+
+    def _track_frame(self, jpg):
+        self.frame_count += 1
+        self.latest_jpeg = jpg
+        self.latest_jpeg_time = time.time()
+        now = time.monotonic()
+        self._update_idle(now)
+        self._publish_passthrough(jpg, now)
+
+        # Measure capture fps over ~1 s windows; several frames often share a chunk
+        self.last_frame_time = now
+        if self._fps_window_start is None:
+            self._fps_window_start, self._fps_window_frames = now, 0
+        self._fps_window_frames += 1
+        elapsed = now - self._fps_window_start
+        if elapsed >= 1.0:
+            window_fps = self._fps_window_frames / elapsed
+            self.capture_fps = window_fps if not self.capture_fps else 0.7 * self.capture_fps + 0.3 * window_fps
+            self._fps_window_start, self._fps_window_frames = now, 0
+        return now
+
+    def _update_idle(self, now):
+        """Enter or leave the adaptive-rate idle state"""
+        idle = bool(get_camera_setting(self.name, "adaptive_rate")) and \
+            now - self._last_motion_time >= float(get_camera_setting(self.name, "idle_after_seconds"))
+        if idle != self.idle:
+            self.idle = idle
+            event_bus.publish("rate", {"camera": self.name, "idle": idle})
+
+    def _channel_viewers(self, channel):
+        return len(self._subscribers.get(channel, ()))
+
+    def _publish_passthrough(self, jpg, now):
+        if self.idle:
+            # Keep-alive rate only while the scene is static
+            idle_fps = float(get_camera_setting(self.name, "idle_stream_fps")) or 1.0
+            if now - self._passthrough_sent < 0.9 / idle_fps:
+                viewers = self._channel_viewers("passthrough")
+                if viewers:
+                    self.stream_frames_saved += viewers
+                    self.stream_bytes_saved += len(jpg) * viewers
+                return
+        self._passthrough_sent = now
+        self._publish("passthrough", jpg)
+
+    def rate_stats(self):
+        """Adaptive-rate state and what it has saved so far"""
+        return {
+            "adaptive": bool(get_camera_setting(self.name, "adaptive_rate")),
+            "idle": self.idle,
+            "stream_bytes_sent": self.stream_bytes_sent,
+            "stream_frames_saved": self.stream_frames_saved,
+            "stream_bytes_saved": self.stream_bytes_saved,
+            "record_frames_saved": self.record_frames_saved,
+            "record_bytes_saved": self.record_bytes_saved
+        }
+
+    def _update_recording(self, jpg, now):
+        # Recording runs on its own thread and never blocks the ingest loop
+        if camera_recordings.get(self.name, False):
+            trigger = "manual"
+        elif now < self._motion_record_until:
+            trigger = "motion"
+        else:
+            trigger = None
+        timestamp = time.time()
+        if trigger:
+            if self.writer is None:
+                self._start_recording(trigger)
+            self.recording_trigger = trigger
+            fps = self.capture_fps
+            if self.idle:
+                # Static scene: record at idle_record_fps; the writer starts a
+                # new segment on entering and leaving idle so playback timing holds
+                record_fps = float(get_camera_setting(self.name, "idle_record_fps")) or 1.0
+                if timestamp < self._next_record_due:
+                    self.record_frames_saved += 1
+                    self.record_bytes_saved += len(jpg)
+                    return
+                # Step the due time by exactly one interval so the admitted
+                # frames match the rate the segment is written at
+                interval = 1.0 / record_fps
+                if timestamp - self._next_record_due < interval:
+                    self._next_record_due += interval
+                else:
+                    self._next_record_due = timestamp + interval
+                fps = min(record_fps, fps) if fps else record_fps
+            self.writer.submit(jpg, timestamp, fps, self.idle)
+        else:
+            self._stop_recording()
+            if get_camera_setting(self.name, "auto_record_motion"):
+                self.pre_roll.append(jpg, timestamp, self.capture_fps,
+                                     float(get_camera_setting(self.name, "pre_roll_seconds")),
+                                     int(get_camera_setting(self.name, "pre_roll_max_bytes")))
+            elif len(self.pre_roll):
+                self.pre_roll.clear()
+
+    @property
+    def recording(self):
+        return self.writer is not None
+
+    def _schedule_pixels(self, jpg, now):
+        motion_due = now >= self._next_motion_check
+        profiles = self._due_profiles(now)
+        if not (motion_due or profiles):
+            return
+        if self._pixel_job is not None and not self._pixel_job.done():
+            self.skipped_count += 1
+            return
+        for name in profiles:
+            self._profile_sent[name] = now
+
+        if motion_due:
+            # Motion detection, at most motion_fps times per second
+            motion_fps = float(get_camera_setting(self.name, "motion_fps")) or 1.0
+            self._next_motion_check = now + 1.0 / motion_fps
+        self._pixel_job = asyncio.get_running_loop().run_in_executor(
+            frame_executor, self._process_pixels, jpg, motion_due, profiles, now, self.recording)
+        self._pixel_job.add_done_callback(self._pixels_done)
+
+    def _due_profiles(self, now):
+        """Profiles with viewers whose fps cap allows a frame now"""
+        watched = [channel[len("overlay:"):] for channel, group in self._subscribers.items()
+                   if group and channel.startswith("overlay:")]
+        if not watched:
+            return {}
+        profiles = get_stream_profiles(self.name)
+        idle_fps = (float(get_camera_setting(self.name, "idle_stream_fps")) or 1.0) if self.idle else None
+        due = {}
+        for name in watched:
+            profile = profiles.get(name, profiles["full"])
+            max_fps = profile.get("max_fps")
+            since_sent = now - self._profile_sent.get(name, 0.0)
+            # Small tolerance so a cap equal to the camera rate does not halve it
+            if max_fps and since_sent < 0.9 / max_fps:
+                continue
+            if idle_fps and since_sent < 0.9 / idle_fps:
+                # Not encoded at all while idle; estimate from the last frame's size
+                viewers = self._channel_viewers(f"overlay:{name}")
+                self.stream_frames_saved += viewers
+                self.stream_bytes_saved += self._profile_size.get(name, 0) * viewers
+                continue
+            due[name] = profile
+        return due
+
+    def _process_pixels(self, jpg, motion_due, profiles, now, recording):
+        """Decode, motion-check and encode every due profile on the frame executor"""
+        latency = self.stage_latency
+        frame = None
+        if profiles:
+            started = time.perf_counter()
+            frame = self._decode_for_profiles(jpg, profiles)
+            latency["decode"].observe(time.perf_counter() - started)
+            if frame is None:
+                return None
+            self.decoded_count += 1
+
+        if motion_due:
+            started = time.perf_counter()
+            self._check_motion(jpg, frame, now)
+            latency["motion"].observe(time.perf_counter() - started)
+
+        if frame is None:
+            return None
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        encoded = {}
+        for name, profile in profiles.items():
+            started = time.perf_counter()
+            width = profile.get("width")
+            if width and width < frame.shape[1]:
+                height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+                image = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            else:
+                image = frame.copy() if len(profiles) > 1 else frame
+            if profile.get("raw"):
+                # Decoded pixels for a consumer that composes its own image
+                encoded[name] = image
+                continue
+            draw_overlay(image, timestamp, recording)
+            encode_started = time.perf_counter()
+            latency["overlay"].observe(encode_started - started)
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(profile.get("quality", 95))])
+            latency["encode"].observe(time.perf_counter() - encode_started)
+            if ret:
+                encoded[name] = buffer.tobytes()
+        return encoded
+
+    def _decode_for_profiles(self, jpg, profiles):
+        """Decode at the smallest DCT scale that still serves the widest profile"""
+        data = np.frombuffer(jpg, dtype=np.uint8)
+        widths = [profile.get("width") for profile in profiles.values()]
+        if self.source_width and all(widths):
+            for flag, factor in ((cv2.IMREAD_REDUCED_COLOR_4, 4), (cv2.IMREAD_REDUCED_COLOR_2, 2)):
+                if self.source_width // factor >= max(widths):
+                    return cv2.imdecode(data, flag)
+        frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if frame is not None:
+            self.source_width = frame.shape[1]
+        return frame
+
+    def _pixels_done(self, job):
+        try:
+            encoded = job.result()
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print("OpenCV decode error:", e)
+            return
+        for name, frame_bytes in (encoded or {}).items():
+            if isinstance(frame_bytes, bytes):
+                self._profile_size[name] = len(frame_bytes)
+            self._publish(f"overlay:{name}", frame_bytes)
+
+    def _check_motion(self, jpg, frame, now):
+        if frame is not None:
+            gray, full_width = MotionDetector.proxy_from_frame(frame, self.source_width)
+        else:
+            gray, full_width = MotionDetector.proxy_from_jpeg(jpg)
+            if gray is None:
+                return
+        sensitivity = float(get_camera_setting(self.name, "motion_sensitivity"))
+        roi = get_camera_setting(self.name, "motion_roi")
+        if self._motion.update(gray, full_width, sensitivity, roi):
+            self._motion_detected(now, self._motion.last_area, self._motion.last_boxes)
+
+    def _motion_detected(self, now, area, boxes=()):
+        """Record a motion hit: alert, event and auto-record hold"""
+        self._last_motion_time = now
+        wall = time.time()
+        with self._motion_event_lock:
+            event = self._motion_event
+            if event is None:
+                self._motion_event = {"start": wall, "last": wall, "peak_area": area, "boxes": list(boxes)}
+            else:
+                event["last"] = wall
+                if area > event["peak_area"]:
+                    event["peak_area"], event["boxes"] = area, list(boxes)
+        motion_alerts[self.name] = {
+            "timestamp": datetime.now().isoformat(),
+            "status": "motion_detected"
+        }
+        system_stats["total_motion_events"] += 1
+        # Push at most one motion event per camera per second
+        if now - self._last_motion_event >= 1.0:
+            self._last_motion_event = now
+            event_bus.publish("motion", {"camera": self.name, "area": round(area)})
+        if get_camera_setting(self.name, "auto_record_motion"):
+            # Keep recording until post_roll_seconds pass without motion
+            self._motion_record_until = now + float(get_camera_setting(self.name, "post_roll_seconds"))
+
+    def _close_motion_event(self, force=False):
+        """Store the current motion event once MOTION_EVENT_GAP_SECONDS pass without a hit"""
+        with self._motion_event_lock:
+            event = self._motion_event
+            if event is None or (not force and time.time() - event["last"] < MOTION_EVENT_GAP_SECONDS):
+                return
+            self._motion_event = None
+        args = (self.name, event["start"], event["last"], round(event["peak_area"]), event["boxes"])
+        if force:
+            # Stopping: write it now so it is not lost with the loop
+            store_motion_event(*args)
+        else:
+            # Keep the SQLite write off the event loop
+            asyncio.get_running_loop().run_in_executor(None, store_motion_event, *args)
+
+    def _start_recording(self, trigger):
+        pre_roll = self.pre_roll.drain() if trigger == "motion" else []
+        self.pre_roll.clear()
+        self.writer = RecordingWriter(self.name, RECORDING_QUEUE_FRAMES + len(pre_roll))
+        for jpg, timestamp, fps in pre_roll:
+            self.writer.submit(jpg, timestamp, fps)
+        self.writer.start()
+        if trigger == "motion":
+            print(f"Started motion recording for camera: {self.name} ({len(pre_roll)} pre-roll frames)")
+        event_bus.publish("recording", {"camera": self.name, "recording": True, "trigger": trigger})
+
+    def _stop_recording(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            event_bus.publish("recording", {"camera": self.name, "recording": False,
+                                            "trigger": self.recording_trigger})
+        self.recording_trigger = None
+
+
+class SharedFrameRing:
+    """Single-producer ring of byte records in a shared memory block.
+
+    Layout: a 16-byte header (write count, slot count, slot size), then a
+    32-byte header per slot (seq, length, width, height, depth, timestamp),
+    then the slot payloads. The producer clears a slot's seq, copies the
+    payload in, stamps the header and only then bumps the write count.
+    Readers copy a slot and re-check its seq, so a record overwritten
+    mid-copy is dropped instead of returned torn. Decoded frames are copied
+    straight from their pixel buffer; nothing is pickled.
+    """
+
+    _HEADER = struct.Struct("<QII")
+    _SLOT = struct.Struct("<QIIIId")
+    _COUNT = struct.Struct("<Q")
+
+    def __init__(self, name=None, slots=WORKER_RING_SLOTS, slot_size=WORKER_RING_SLOT_BYTES):
+        if name is None:
+            size = self._HEADER.size + slots * (self._SLOT.size + slot_size)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._HEADER.pack_into(self._shm.buf, 0, 0, slots, slot_size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            _, slots, slot_size = self._HEADER.unpack_from(self._shm.buf, 0)
+        self.name = self._shm.name
+        self.slots = slots
+        self.slot_size = slot_size
+        self._data = np.ndarray((self._shm.size,), dtype=np.uint8, buffer=self._shm.buf)
+
+    def _offsets(self, seq):
+        index = seq % self.slots
+        header = self._HEADER.size + index * self._SLOT.size
+        data = self._HEADER.size + self.slots * self._SLOT.size + index * self.slot_size
+        return header, data
+
+    def write(self, payload, timestamp=None):
+        """Publish JPEG bytes or a decoded frame; False if it does not fit a slot"""
+        if isinstance(payload, np.ndarray):
+            height, width = payload.shape[:2]
+            depth = payload.shape[2] if payload.ndim > 2 else 1
+            payload = np.ascontiguousarray(payload).reshape(-1)
+        else:
+            width = height = depth = 0
+            payload = np.frombuffer(payload, dtype=np.uint8)
+        length = payload.size
+        if length > self.slot_size:
+            return False
+        buf = self._shm.buf
+        seq = self._COUNT.unpack_from(buf, 0)[0] + 1
+        header, data = self._offsets(seq)
+        self._COUNT.pack_into(buf, header, 0)
+        self._data[data:data + length] = payload
+        self._SLOT.pack_into(buf, header, seq, length, width, height, depth,
+                             time.time() if timestamp is None else timestamp)
+        self._COUNT.pack_into(buf, 0, seq)
+        return True
+
+    def read(self, last_seq=0, latest=False):
+        """Records newer than last_seq, oldest first, as (seq, timestamp, width, height, depth, bytes)"""
+        buf = self._shm.buf
+        count = self._COUNT.unpack_from(buf, 0)[0]
+        if count <= last_seq:
+            return []
+        first = count if latest else max(last_seq + 1, count - self.slots + 1)
+        records = []
+        for seq in range(first, count + 1):
+            header, data = self._offsets(seq)
+            slot_seq, length, width, height, depth, timestamp = self._SLOT.unpack_from(buf, header)
+            if slot_seq != seq:
+                continue
+            payload = self._data[data:data + length].tobytes()
+            if self._COUNT.unpack_from(buf, header)[0] != seq:
+                continue
+            records.append((seq, timestamp, width, height, depth, payload))
+        return records
+
+    def close(self, unlink=False):
+        # The NumPy view must go before the mapping can be closed
+        self._data = None
+        self._shm.close()
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class WorkerCameraHub(CameraHub):
+    """Camera ingest running inside a frame worker process.
+
+    Runs the normal parse, motion and encode pipeline, but writes each
+    channel into the shared-memory ring the parent named for it instead of
+    to subscribers, and reports motion over the worker event queue. A
+    channel with a ring counts as watched. Recording stays in the parent.
+    """
+
+    def __init__(self, name: str, url: str, events):
+        super().__init__(name, url)
+        self._events = events
+        self._rings = {}
+        self._recording = False
+        self._viewer_counts = {}
+
+    @property
+    def recording(self):
+        return self._recording
+
+    def set_channels(self, rings, recording, viewers):
+        self._recording = recording
+        self._viewer_counts = viewers
+        for channel in list(self._rings):
+            if channel not in rings:
+                self._rings.pop(channel).close()
+        for channel, ring_name in rings.items():
+            if channel not in self._rings:
+                self._rings[channel] = SharedFrameRing(ring_name)
+        self._subscribers = {channel: {channel} for channel in self._rings}
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
+        self._subscribers = {}
+
+    def _publish(self, channel, frame_bytes):
+        ring = self._rings.get(channel)
+        if ring is not None and not ring.write(frame_bytes):
+            if not self.frames_oversize:
+                print(f"Camera {self.name}: {channel} frame larger than the {ring.slot_size} byte ring slot; "
+                      f"dropping such frames")
+            self.frames_oversize += 1
+
+    def _update_recording(self, jpg, now):
+        pass
+
+    def _publish_passthrough(self, jpg, now):
+        # The parent records every frame and applies the keep-alive rate itself
+        self._publish("passthrough", jpg)
+
+    def _channel_viewers(self, channel):
+        return self._viewer_counts.get(channel, 0)
+
+    def _due_profiles(self, now):
+        due = super()._due_profiles(now)
+        if "decoded" in due:
+            # Unencoded pixels for the parent's compositors
+            due["decoded"] = {"width": WORKER_DECODED_WIDTH, "raw": True}
+        return due
+
+    def _motion_detected(self, now, area, boxes=()):
+        self._last_motion_time = now
+        self._events.put(("motion", self.name, area, boxes))
+
+
+class RemoteCameraHub(CameraHub):
+    """Parent-side hub for a camera whose ingest runs in a frame worker.
+
+    The worker owns the upstream connection, parsing, motion analysis and
+    encoding. This hub creates the shared-memory rings, tells the worker
+    which channels have viewers, and on every poll copies new frames out
+    of the rings and fans the bytes out. Recording, pre-roll and events stay
+    in this process, fed from the camera's own JPEGs.
+    """
+
+    def __init__(self, name: str, url: str, pool):
+        super().__init__(name, url)
+        self._pool = pool
+        self._rings = {}
+        self._ring_seq = {}
+        self._sent_channels = None
+        self._decoded_frame = None
+        self._decoded_wanted_at = None
+        self._started = False
+        self._worker_stream_saved = (0, 0)
+
+    def start(self):
+        self._ring("passthrough")
+        self.attach()
+        self._started = True
+
+    def attach(self):
+        """(Re)register this camera with its worker"""
+        self._pool.send(self.name, ("add", self.name, self.url, camera_settings.get(self.name)))
+        self._sent_channels = None
+        self._send_channels()
+
+    def stop(self):
+        self._started = False
+        self._pool.send(self.name, ("remove", self.name))
+        super().stop()
+        for ring in self._rings.values():
+            ring.close(unlink=True)
+        self._rings.clear()
+
+    @property
+    def running(self):
+        return self._started and self._pool.alive(self.name)
+
+    def subscribe(self, mode="overlay", profile="full"):
+        subscriber = super().subscribe(mode, profile)
+        self._send_channels()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        super().unsubscribe(subscriber)
+        self._send_channels()
+
+    def latest_decoded(self):
+        """Newest decoded frame from the worker, requesting them if needed"""
+        self._decoded_wanted_at = time.monotonic()
+        self._send_channels()
+        return self._decoded_frame
+
+    def _ring(self, channel):
+        ring = self._rings.get(channel)
+        if ring is None:
+            if channel == "overlay:decoded":
+                ring = SharedFrameRing(slots=3, slot_size=WORKER_DECODED_WIDTH * WORKER_DECODED_WIDTH * 3)
+            else:
+                ring = SharedFrameRing()
+            self._rings[channel] = ring
+        return ring
+
+    def _send_channels(self):
+        channels = ["passthrough"] + [channel for channel, group in self._subscribers.items()
+                                      if group and channel != "passthrough"]
+        if self._decoded_wanted_at is not None:
+            channels.append("overlay:decoded")
+        viewers = {channel: len(group) for channel, group in self._subscribers.items() if group}
+        state = (tuple(sorted(channels)), self.recording, tuple(sorted(viewers.items())))
+        if state == self._sent_channels:
+            return
+        self._sent_channels = state
+        rings = {channel: self._ring(channel).name for channel in channels}
+        self._pool.send(self.name, ("channels", self.name, rings, self.recording, viewers))
+
+    def poll(self, now):
+        """Fan out whatever the worker published since the last poll"""
+        for channel, ring in list(self._rings.items()):
+            records = ring.read(self._ring_seq.get(channel, 0), latest=channel != "passthrough")
+            if not records:
+                continue
+            self._ring_seq[channel] = records[-1][0]
+            if channel == "passthrough":
+                # Every camera frame, in order, for recording and passthrough viewers
+                for record in records:
+                    self._process_jpeg(record[5])
+                continue
+            _, _, width, height, depth, payload = records[-1]
+            if channel == "overlay:decoded":
+                self._decoded_frame = np.frombuffer(payload, dtype=np.uint8).reshape(height, width, depth)
+                continue
+            self._publish(channel, payload)
+        if self._decoded_wanted_at is not None and now - self._decoded_wanted_at > MOSAIC_IDLE_SECONDS:
+            self._decoded_wanted_at = None
+            self._decoded_frame = None
+            self._send_channels()
+
+    def _schedule_pixels(self, jpg, now):
+        # Pixel work happens in the worker
+        pass
+
+    def load_metrics(self, snapshot):
+        """Adopt the worker's ingest counters and stage histograms"""
+        self.bytes_received = snapshot["bytes_received"]
+        self.reconnects = snapshot["reconnects"]
+        self.last_error = snapshot["last_error"]
+        self.decoded_count = snapshot["decoded"]
+        self.skipped_count = snapshot["skipped"]
+        self.frames_oversize = snapshot["oversize"]
+        self._worker_stream_saved = snapshot["stream_saved"]
+        for stage, values in snapshot["stages"].items():
+            self.stage_latency[stage].load(values)
+
+    def rate_stats(self):
+        # Overlay frames are skipped in the worker; passthrough ones here
+        stats = super().rate_stats()
+        stats["stream_frames_saved"] += self._worker_stream_saved[0]
+        stats["stream_bytes_saved"] += self._worker_stream_saved[1]
+        return stats
+
+    def _start_recording(self, trigger):
+        super()._start_recording(trigger)
+        self._send_channels()
+
+    def _stop_recording(self):
+        recording = self.writer is not None
+        super()._stop_recording()
+        if recording and self._started:
+            self._send_channels()
+
+
+def run_frame_worker(control, events, threads):
+    """Entry point of a frame worker process"""
+    # Ctrl+C reaches the whole process group; the parent stops workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(frame_worker_main(control, events, threads))
+
+async def frame_worker_main(control, events, threads):
+    global frame_executor
+    frame_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="frame")
+    loop = asyncio.get_running_loop()
+    parent = os.getppid()
+    next_stats = 0.0
     while True:
+        now = time.monotonic()
+        if now >= next_stats:
+            # Ingest metrics travel to the parent once a second as plain numbers
+            next_stats = now + 1.0
+            for hub in list(camera_hubs.values()):
+                events.put(("stats", hub.name, hub.metrics_snapshot()))
+        try:
+            message = await loop.run_in_executor(None, control.get, True, 1.0)
+        except queue.Empty:
+            if os.getppid() != parent:
+                break
+            continue
+        command, args = message[0], message[1:]
+        if command == "stop":
+            break
         try:
-            response = requests.get(camera_url, stream=True, timeout=5)
-            if response.status_code != 200:
+            if command == "add":
+                name, url, settings = args
+                if settings is not None:
+                    camera_settings[name] = settings
+                if name not in camera_hubs:
+                    camera_hubs[name] = WorkerCameraHub(name, url, events)
+                    camera_hubs[name].start()
+            elif command == "remove":
+                hub = camera_hubs.pop(args[0], None)
+                if hub is not None:
+                    hub.stop()
+                camera_settings.pop(args[0], None)
+            elif command == "settings":
+                camera_settings[args[0]] = args[1]
+            elif command == "channels":
+                hub = camera_hubs.get(args[0])
+                if hub is not None:
+                    hub.set_channels(args[1], args[2], args[3])
+        except Exception as e:
+            print(f"Frame worker error ({command}):", e)
+    for hub in list(camera_hubs.values()):
+        hub.stop()
+    frame_executor.shutdown(wait=False)
+
+
+class FrameWorkerPool:
+    """Processes that cameras are sharded across in worker mode.
+
+    A camera is assigned to a worker by a stable hash of its name. Each
+    worker has its own control queue; all of them report motion on one
+    event queue. A single poller task on the event loop drains that queue
+    and copies new frames out of every camera's rings. Workers that die are
+    restarted and their cameras re-attached.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._controls = []
+        self._workers = []
+        self._threads = max(2, FRAME_WORKERS // processes)
+        self._task = None
+
+    def start(self):
+        for index in range(self.processes):
+            self._controls.append(self._context.Queue())
+            self._workers.append(None)
+            self._spawn(index)
+        self._task = asyncio.get_running_loop().create_task(self._poll(), name="frame-worker-poll")
+
+    def _spawn(self, index):
+        worker = self._context.Process(target=run_frame_worker, name=f"frame-worker-{index}",
+                                       args=(self._controls[index], self._events, self._threads), daemon=True)
+        worker.start()
+        self._workers[index] = worker
+
+    def shard(self, camera_name: str):
+        return zlib.crc32(camera_name.encode()) % self.processes
+
+    def send(self, camera_name: str, message):
+        self._controls[self.shard(camera_name)].put(message)
+
+    def alive(self, camera_name: str):
+        worker = self._workers[self.shard(camera_name)]
+        return worker is not None and worker.is_alive()
+
+    def alive_count(self):
+        return sum(1 for worker in self._workers if worker is not None and worker.is_alive())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for control in self._controls:
+            control.put(("stop",))
+        for worker in self._workers:
+            worker.join(5)
+            if worker.is_alive():
+                worker.terminate()
+        # Wait for the feeder threads before dropping the queues: if the last
+        # reference went on a daemon feeder thread, exit could cut off the
+        # semaphore cleanup and leave them to the resource tracker
+        for channel in self._controls + [self._events]:
+            channel.close()
+            channel.join_thread()
+        self._controls, self._events = [], None
+
+    def _check_workers(self):
+        for index, worker in enumerate(self._workers):
+            if worker.is_alive():
                 continue
-            bytes_data = bytes()
-            for chunk in response.iter_content(chunk_size=8192):
-                bytes_data += chunk
-                a = bytes_data.find(b'\xff\xd8')
-                b = bytes_data.find(b'\xff\xd9')
-                if a != -1 and b != -1:
-                    jpg = bytes_data[a:b+2]
-                    bytes_data = bytes_data[b+2:]
+            print(f"Frame worker {index} exited with code {worker.exitcode}; restarting")
+            self._spawn(index)
+            for hub in list(camera_hubs.values()):
+                if isinstance(hub, RemoteCameraHub) and self.shard(hub.name) == index:
+                    hub.attach()
+
+    async def _poll(self):
+        next_check = 0.0
+        while True:
+            now = time.monotonic()
+            try:
+                for hub in list(camera_hubs.values()):
+                    if isinstance(hub, RemoteCameraHub):
+                        hub.poll(now)
+                while True:
                     try:
-                        frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                        if frame is None:
-                            continue
-                        
-                        # Motion detection
-                        if camera_name and previous_frame is not None:
-                            if detect_motion(previous_frame, frame):
-                                motion_alerts[camera_name] = {
-                                    "timestamp": datetime.now().isoformat(),
-                                    "status": "motion_detected"
-                                }
-                                system_stats["total_motion_events"] += 1
-                        
-                        previous_frame = frame.copy()
-                        
-                        # Recording logic
-                        if camera_name and camera_name in camera_recordings and camera_recordings[camera_name]:
-                            if not recording:
-                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                filename = f"recordings/{camera_name}_{timestamp}.mp4"
-                                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                                video_writer = cv2.VideoWriter(filename, fourcc, 20.0, (frame.shape[1], frame.shape[0]))
-                                recording = True
-                                system_stats["total_recordings"] += 1
-                            
-                            if video_writer and video_writer.isOpened():
-                                video_writer.write(frame)
-                        else:
-                            if recording and video_writer:
-                                video_writer.release()
-                                recording = False
-                                video_writer = None
-                        
-                        # Add timestamp overlay
-                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        
-                        # Add recording indicator
-                        if recording:
-                            cv2.circle(frame, (frame.shape[1] - 30, 30), 10, (0, 0, 255), -1)
-                            cv2.putText(frame, "REC", (frame.shape[1] - 60, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                        
-                    except Exception as e:
-                        print("OpenCV decode error:", e)
-                        continue
-                    
-                    ret, buffer = cv2.imencode('.jpg', frame)
-                    if not ret:
+                        message = self._events.get_nowait()
+                    except queue.Empty:
+                        break
+                    hub = camera_hubs.get(message[1])
+                    if not isinstance(hub, RemoteCameraHub):
                         continue
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Camera stream error ({camera_url}):", e)
-            time.sleep(5)
+                    if message[0] == "motion":
+                        hub._motion_detected(now, message[2], message[3])
+                    elif message[0] == "stats":
+                        hub.load_metrics(message[2])
+                if now >= next_check:
+                    next_check = now + 1.0
+                    self._check_workers()
+            except Exception as e:
+                print("Frame worker poll error:", e)
+            await asyncio.sleep(WORKER_POLL_SECONDS)
+
+
+class MosaicStream:
+    """Server-side grid of several cameras delivered as one MJPEG stream.
+
+    Each tick the latest JPEG of every camera that changed is decoded at a
+    reduced scale (or, in worker mode, the worker's decoded frame is used
+    directly), fitted into its cell and copied into a preallocated
+    canvas with a NumPy slice assignment. The canvas is encoded once and
+    shared by every viewer of the same layout. The task stops itself once
+    it has had no viewers for MOSAIC_IDLE_SECONDS.
+    """
 
-# Start background health monitoring
-threading.Thread(target=check_camera_health, daemon=True).start()
+    def __init__(self, key, cameras, cols, tile_width, tile_height, fps):
+        self.key = key
+        self.cameras = cameras
+        self.cols = cols
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.fps = fps
+        rows = (len(cameras) + cols - 1) // cols
+        self.canvas = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+        self.latest_frame = None
+        self.frame_count = 0
+        self._sources = [None] * len(cameras)
+        self._subscribers = set()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run(), name=f"mosaic-{len(self.cameras)}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        self._subscribers.clear()
+
+    @property
+    def viewer_count(self):
+        return len(self._subscribers)
+
+    async def stream(self):
+        subscriber = FrameSubscriber()
+        self._subscribers.add(subscriber)
+        if self.latest_frame is not None:
+            subscriber.put(self.latest_frame)
+        try:
+            while not subscriber.closed:
+                frame_bytes = await subscriber.get(timeout=1.0)
+                if frame_bytes is None:
+                    continue
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            self._subscribers.discard(subscriber)
+            subscriber.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        idle_since = time.monotonic()
+        try:
+            while True:
+                started = time.monotonic()
+                if self._subscribers:
+                    idle_since = started
+                elif started - idle_since > MOSAIC_IDLE_SECONDS:
+                    break
+
+                # Only re-decode cells whose camera produced a new frame
+                updates = []
+                for index, cam_name in enumerate(self.cameras):
+                    hub = camera_hubs.get(cam_name)
+                    source = None
+                    if hub is not None:
+                        # Worker-decoded pixels when available, else the camera JPEG
+                        source = hub.latest_decoded()
+                        if source is None:
+                            source = hub.latest_jpeg
+                    if source is not None and source is not self._sources[index]:
+                        self._sources[index] = source
+                        updates.append((index, source))
+                if (updates or self.latest_frame is None) and self._subscribers:
+                    try:
+                        frame_bytes = await loop.run_in_executor(frame_executor, self._compose, updates)
+                    except Exception as e:
+                        print("Mosaic compose error:", e)
+                        frame_bytes = None
+                    if frame_bytes is not None:
+                        self.latest_frame = frame_bytes
+                        self.frame_count += 1
+                        for subscriber in list(self._subscribers):
+                            subscriber.put(frame_bytes)
+                await asyncio.sleep(max(0.0, 1.0 / self.fps - (time.monotonic() - started)))
+        finally:
+            if mosaic_streams.get(self.key) is self:
+                del mosaic_streams[self.key]
+            self.stop()
+
+    def _compose(self, updates):
+        for index, source in updates:
+            tile = self._fit_tile(source) if isinstance(source, np.ndarray) else self._decode_tile(source)
+            if tile is None:
+                continue
+            row, col = divmod(index, self.cols)
+            y = row * self.tile_height + (self.tile_height - tile.shape[0]) // 2
+            x = col * self.tile_width + (self.tile_width - tile.shape[1]) // 2
+            cell = self.canvas[row * self.tile_height:(row + 1) * self.tile_height,
+                               col * self.tile_width:(col + 1) * self.tile_width]
+            cell[:] = 0
+            self.canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+            cv2.putText(cell, self.cameras[index], (6, 18), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        ret, buffer = cv2.imencode('.jpg', self.canvas, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        return buffer.tobytes() if ret else None
+
+    def _decode_tile(self, jpg):
+        """Decode with the cheapest DCT downscale that still covers the cell"""
+        data = np.frombuffer(jpg, dtype=np.uint8)
+        frame = None
+        for flag, factor in ((cv2.IMREAD_REDUCED_COLOR_8, 8), (cv2.IMREAD_REDUCED_COLOR_4, 4),
+                             (cv2.IMREAD_REDUCED_COLOR_2, 2), (cv2.IMREAD_COLOR, 1)):
+            frame = cv2.imdecode(data, flag)
+            if frame is None:
+                return None
+            if frame.shape[1] >= self.tile_width or frame.shape[0] >= self.tile_height or factor == 1:
+                break
+        return self._fit_tile(frame)
+
+    def _fit_tile(self, frame):
+        scale = min(self.tile_width / frame.shape[1], self.tile_height / frame.shape[0])
+        size = (max(1, int(frame.shape[1] * scale)), max(1, int(frame.shape[0] * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def start_camera_hub(camera_name: str):
+    """Start the ingest task for a camera if it is not already running.
+
+    Must be called on the event loop.
+    """
+    if camera_name not in camera_hubs:
+        if frame_worker_pool is not None:
+            hub = RemoteCameraHub(camera_name, CAMERAS[camera_name], frame_worker_pool)
+        else:
+            hub = CameraHub(camera_name, CAMERAS[camera_name])
+        camera_hubs[camera_name] = hub
+        hub.start()
+    return camera_hubs[camera_name]
+
+def stop_camera_hub(camera_name: str):
+    """Stop and forget the ingest worker for a camera"""
+    hub = camera_hubs.pop(camera_name, None)
+    if hub:
+        hub.stop()
+
+def sync_recordings_index():
+    try:
+        recordings_index.sync()
+    except Exception as e:
+        print(f"Error syncing recordings index: {e}")
+    # Budgets may already be exceeded by what was on disk
+    retention_manager.notify()
+
+@app.on_event("startup")
+async def start_background_workers():
+    global frame_executor, frame_worker_pool
+    # Bounded pool for CPU-bound pixel work; each camera has at most one job queued
+    frame_executor = ThreadPoolExecutor(max_workers=FRAME_WORKERS, thread_name_prefix="frame")
+    if WORKER_PROCESSES > 0:
+        # Ingest and pixel work move to worker processes; this one only fans out
+        frame_worker_pool = FrameWorkerPool(WORKER_PROCESSES)
+        frame_worker_pool.start()
+    # Start background health monitoring
+    health_monitor.start()
+    # Pick up recordings added, changed or removed while we were down
+    threading.Thread(target=sync_recordings_index, daemon=True).start()
+    thumbnail_backfill.start()
+    retention_manager.start()
+    for cam_name in list(CAMERAS.keys()):
+        start_camera_hub(cam_name)
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    writers = [hub.writer for hub in camera_hubs.values() if hub.writer is not None]
+    for mosaic in list(mosaic_streams.values()):
+        mosaic.stop()
+    for cam_name in list(camera_hubs.keys()):
+        stop_camera_hub(cam_name)
+    # Let writers flush queued frames and finalize their segments
+    await asyncio.to_thread(lambda: [writer.join(10) for writer in writers])
+    if frame_worker_pool is not None:
+        await asyncio.to_thread(frame_worker_pool.stop)
+    frame_executor.shutdown(wait=False)
 
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
@@ -177,7 +2588,7 @@ def index(request: Request):
     })
 
 @app.post("/api/camera/add")
-def add_camera(data: dict):
+async def add_camera(data: dict):
     """Add a new camera to the system"""
     try:
         name = data.get("name", "").strip()
@@ -191,6 +2602,10 @@ def add_camera(data: dict):
         if name.lower() in existing_names:
             raise HTTPException(status_code=400, detail=f"Camera name '{name}' already exists. Please choose a different name.")
         
+        # /video_feed/mosaic is the grid stream
+        if name.lower() == "mosaic":
+            raise HTTPException(status_code=400, detail="Camera name 'mosaic' is reserved")
+        
         # Validate URL format
         if not url.startswith(("http://", "https://")):
             raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
@@ -205,6 +2620,7 @@ def add_camera(data: dict):
             "last_check": "never",
             "error": "Not checked yet"
         }
+        start_camera_hub(name)
         
         return {
             "status": "success",
@@ -221,7 +2637,7 @@ def add_camera(data: dict):
         raise HTTPException(status_code=500, detail=f"Failed to add camera: {str(e)}")
 
 @app.delete("/api/camera/{camera_name}")
-def remove_camera(camera_name: str):
+async def remove_camera(camera_name: str):
     """Remove a camera from the system"""
     try:
         if camera_name not in CAMERAS:
@@ -232,6 +2648,8 @@ def remove_camera(camera_name: str):
             camera_recordings[camera_name] = False
             recording_states[camera_name] = False
         
+        stop_camera_hub(camera_name)
+
         # Remove camera from all dictionaries
         del CAMERAS[camera_name]
         save_cameras()  # Persist changes
@@ -250,32 +2668,155 @@ def remove_camera(camera_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to remove camera: {str(e)}")
 
+@app.get("/video_feed/mosaic")
+async def mosaic_feed(cameras: str = None, cols: int = None, tile_width: int = 320,
+                      tile_height: int = 180, fps: float = 5):
+    """Single MJPEG stream compositing several cameras into a grid.
+
+    cameras is a comma-separated list (default: all cameras); cols defaults
+    to a near-square layout. Viewers asking for the same layout share one
+    compositor.
+    """
+    names = [name.strip() for name in cameras.split(",") if name.strip()] if cameras else list(CAMERAS.keys())
+    missing = [name for name in names if name not in CAMERAS]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Camera not found: {', '.join(missing)}")
+    if not names:
+        raise HTTPException(status_code=400, detail="No cameras selected")
+    cols = cols or math.ceil(math.sqrt(len(names)))
+    if not (1 <= cols <= len(names)) or not (16 <= tile_width <= 1920) or not (16 <= tile_height <= 1080) \
+            or not (0 < fps <= 30):
+        raise HTTPException(status_code=400, detail="Invalid mosaic layout")
+
+    key = (tuple(names), cols, tile_width, tile_height, fps)
+    mosaic = mosaic_streams.get(key)
+    if mosaic is None:
+        for name in names:
+            start_camera_hub(name)
+        mosaic = MosaicStream(key, names, cols, tile_width, tile_height, fps)
+        mosaic_streams[key] = mosaic
+        mosaic.start()
+    return StreamingResponse(mosaic.stream(),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
+
 @app.get("/video_feed/{camera_name}")
-def video_feed(camera_name: str):
+async def video_feed(camera_name: str, mode: str = None, profile: str = None):
     if camera_name not in CAMERAS:
         raise HTTPException(status_code=404, detail="Camera not found")
-    return StreamingResponse(generate_frames(CAMERAS[camera_name], camera_name),
+    mode = mode or get_camera_setting(camera_name, "stream_mode")
+    if mode not in STREAM_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode. Use one of: {', '.join(STREAM_MODES)}")
+    profile = profile or get_camera_setting(camera_name, "stream_profile")
+    profiles = get_stream_profiles(camera_name)
+    if profile not in profiles:
+        raise HTTPException(status_code=400, detail=f"Invalid profile. Use one of: {', '.join(profiles)}")
+    hub = start_camera_hub(camera_name)
+    return StreamingResponse(hub.stream(mode, profile),
                              media_type="multipart/x-mixed-replace; boundary=frame")
 
-@app.get("/api/camera_status")
-def get_camera_status():
-    """Get status of all cameras"""
+def get_camera_status_snapshot():
     # Initialize status for cameras that haven't been checked yet
-    for cam_name in CAMERAS.keys():
+    for cam_name in list(CAMERAS.keys()):
         if cam_name not in camera_status:
             camera_status[cam_name] = {
                 "status": "unknown",
                 "last_check": "never",
                 "error": "Not checked yet"
             }
-    return JSONResponse(camera_status)
+    return dict(camera_status)
+
+@app.get("/api/camera_status")
+def get_camera_status():
+    """Get status of all cameras"""
+    return JSONResponse(get_camera_status_snapshot())
 
 @app.get("/api/motion_alerts")
-def get_motion_alerts():
-    """Get and clear motion alerts"""
-    alerts = motion_alerts.copy()
-    motion_alerts.clear()
-    return JSONResponse(alerts)
+def get_motion_alerts(since: int = None):
+    """Get motion alerts without consuming them.
+
+    Without since, returns the latest alert per camera. With since, returns
+    the motion events published after that sequence number.
+    """
+    if since is None:
+        return JSONResponse(motion_alerts.copy())
+    return {"last_seq": event_bus.last_seq, "events": event_bus.since(since, "motion")}
+
+@app.get("/api/motion_events")
+def get_motion_events(camera: str = None, start: str = None, end: str = None,
+                      limit: int = 100, offset: int = 0):
+    """Search stored motion events by camera and time range, oldest first.
+
+    start/end accept epoch seconds or ISO 8601 and select events that
+    overlap the range. Each event names the recording segment to play and
+    where to seek in it; seek_url uses a media fragment. The unpaginated
+    total is returned in X-Total-Count.
+    """
+    if limit < 0 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit and offset must not be negative")
+    total, rows = recordings_index.query_motion_events(camera, parse_time_param(start), parse_time_param(end),
+                                                       limit, offset)
+    events = []
+    for row in rows:
+        recording = None
+        segment = recordings_index.covering(row["camera"], row["start_time"], row["end_time"])
+        if segment is not None:
+            offset_seconds = max(0.0, row["start_time"] - segment["start_time"])
+            url = f"/recordings/{segment['filename']}"
+            recording = {
+                "filename": segment["filename"],
+                "url": url,
+                "offset_seconds": round(offset_seconds, 2),
+                "seek_url": f"{url}#t={offset_seconds:.1f}"
+            }
+        events.append({
+            "id": row["id"],
+            "camera": row["camera"],
+            "start_time": row["start_time"],
+            "end_time": row["end_time"],
+            "start": datetime.fromtimestamp(row["start_time"]).isoformat(),
+            "end": datetime.fromtimestamp(row["end_time"]).isoformat(),
+            "duration_seconds": round(row["end_time"] - row["start_time"], 2),
+            "peak_area": row["peak_area"],
+            "boxes": row["boxes"],
+            "recording": recording
+        })
+    return JSONResponse(events, headers={"X-Total-Count": str(total)})
+
+@app.get("/api/events")
+async def stream_events(request: Request, since: int = None):
+    """Server-Sent Events stream of motion, health and recording events.
+
+    Each event's id is its sequence number; EventSource resumes with the
+    Last-Event-ID header on reconnect (or pass ?since=<seq> explicitly).
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    subscriber = event_bus.subscribe(asyncio.get_running_loop(), since)
+
+    async def event_stream():
+        try:
+            # Current state first so a fresh dashboard needs no extra requests
+            snapshot = {
+                "cameras": get_camera_status_snapshot(),
+                "recording": {name: {"active": hub.writer is not None,
+                                     "trigger": hub.recording_trigger or "manual"}
+                              for name, hub in camera_hubs.items()},
+                "last_seq": event_bus.last_seq
+            }
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not subscriber.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/api/recording/{camera_name}/{action}")
 def control_recording(camera_name: str, action: str):
@@ -305,13 +2846,29 @@ def control_recording(camera_name: str, action: str):
         print(f"Error controlling recording for {camera_name}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to {action} recording: {str(e)}")
 
+@app.get("/api/recording/{camera_name}/status")
+def get_recording_status(camera_name: str):
+    """Get recording writer state for a specific camera"""
+    if camera_name not in CAMERAS:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    hub = camera_hubs.get(camera_name)
+    writer = hub.writer if hub else None
+    return {
+        "camera": camera_name,
+        "recording": camera_recordings.get(camera_name, False),
+        "trigger": hub.recording_trigger if hub else None,
+        "capture_fps": round(hub.capture_fps, 2) if hub else 0,
+        "writer": writer.stats() if writer else None,
+        "pre_roll": hub.pre_roll.stats() if hub else None
+    }
+
 @app.get("/recordings/{filename}")
 def serve_recording(filename: str):
     """Serve recording files for playback"""
     try:
-        filepath = os.path.join("recordings", filename)
+        filepath = os.path.join(RECORDINGS_DIR, filename)
         if os.path.exists(filepath) and filename.endswith(".mp4"):
-            from fastapi.responses import FileResponse
             return FileResponse(
                 filepath,
                 media_type="video/mp4",
@@ -325,87 +2882,84 @@ def serve_recording(filename: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to serve recording: {str(e)}")
 
-@app.get("/api/recordings/thumbnail/{filename}")
-def get_recording_thumbnail(filename: str):
-    """Generate and serve thumbnail for recording"""
+def serve_thumbnail_file(request: Request, filename: str, path: str):
+    """Serve a finished thumbnail with validators and a long cache lifetime"""
+    recording_path = os.path.join(RECORDINGS_DIR, filename)
+    if not filename.endswith(".mp4") or not os.path.exists(recording_path):
+        raise HTTPException(status_code=404, detail="Recording not found")
+
     try:
-        filepath = os.path.join("recordings", filename)
-        if not os.path.exists(filepath):
-            raise HTTPException(status_code=404, detail="Recording not found")
-        
-        # Generate thumbnail from video
-        cap = cv2.VideoCapture(filepath)
-        if not cap.isOpened():
-            raise HTTPException(status_code=500, detail="Failed to open video file")
-        
-        ret, frame = cap.read()
-        cap.release()
-        
-        if ret:
-            # Resize frame for thumbnail
-            height, width = frame.shape[:2]
-            aspect_ratio = width / height
-            thumb_height = 60
-            thumb_width = int(thumb_height * aspect_ratio)
-            
-            thumbnail = cv2.resize(frame, (thumb_width, thumb_height))
-            
-            # Convert to JPEG
-            ret, buffer = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            
-            if ret:
-                from fastapi.responses import Response
-                return Response(
-                    content=buffer.tobytes(),
-                    media_type="image/jpeg"
-                )
-        
-        raise HTTPException(status_code=500, detail="Could not generate thumbnail")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate thumbnail: {str(e)}")
+        stat = os.stat(path)
+    except OSError:
+        # Not generated yet: backfill off the request thread, don't cache the placeholder
+        if not any(hub.writer and hub.writer.current_file == filename for hub in camera_hubs.values()):
+            thumbnail_backfill.request(filename)
+        return Response(content=placeholder_thumbnail(), media_type="image/jpeg",
+                        headers={"Cache-Control": "no-store"})
+
+    etag = f'"{int(stat.st_mtime_ns):x}-{stat.st_size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": f"public, max-age={THUMBNAIL_CACHE_SECONDS}, immutable"
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since") == last_modified:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+_placeholder_thumbnail = None
+
+def placeholder_thumbnail():
+    global _placeholder_thumbnail
+    if _placeholder_thumbnail is None:
+        blank = np.full((THUMBNAIL_HEIGHT, THUMBNAIL_HEIGHT * 16 // 9, 3), 48, dtype=np.uint8)
+        _placeholder_thumbnail = cv2.imencode('.jpg', blank)[1].tobytes()
+    return _placeholder_thumbnail
+
+@app.get("/api/recordings/thumbnail/{filename}")
+def get_recording_thumbnail(request: Request, filename: str):
+    """Serve the thumbnail stored when the recording was finalized"""
+    return serve_thumbnail_file(request, filename, thumbnail_paths(filename)[0])
+
+@app.get("/api/recordings/sprite/{filename}")
+def get_recording_sprite(request: Request, filename: str):
+    """Serve the horizontal sprite strip of frames sampled across the recording"""
+    return serve_thumbnail_file(request, filename, thumbnail_paths(filename)[1])
+
 
 @app.get("/api/recordings")
-def get_recordings():
-    """Get list of all recordings with detailed info"""
-    recordings = []
-    try:
-        if os.path.exists("recordings"):
-            for file in os.listdir("recordings"):
-                if file.endswith(".mp4"):
-                    filepath = os.path.join("recordings", file)
-                    stat = os.stat(filepath)
-                    
-                    # Get video duration using OpenCV
-                    try:
-                        cap = cv2.VideoCapture(filepath)
-                        fps = cap.get(cv2.CAP_PROP_FPS)
-                        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                        duration_seconds = frame_count / fps if fps > 0 else 0
-                        cap.release()
-                        
-                        hours = int(duration_seconds // 3600)
-                        minutes = int((duration_seconds % 3600) // 60)
-                        seconds = int(duration_seconds % 60)
-                        duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                    except:
-                        duration_str = "00:00:00"
-                    
-                    recordings.append({
-                        "filename": file,
-                        "size": stat.st_size,
-                        "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "camera": file.split('_')[0],
-                        "duration": duration_str,
-                        "url": f"/recordings/{file}",
-                        "thumbnail": f"/api/recordings/thumbnail/{file}"
-                    })
-            
-            # Sort by creation time, newest first
-            recordings.sort(key=lambda x: x['created'], reverse=True)
-    except Exception as e:
-        print(f"Error reading recordings: {e}")
-    
-    return JSONResponse(recordings)
+def get_recordings(camera: str = None, start: str = None, end: str = None,
+                   min_duration: float = None, max_duration: float = None,
+                   limit: int = None, offset: int = 0):
+    """List recordings from the index, optionally filtered and paginated.
+
+    start/end accept epoch seconds or ISO 8601 and select segments that
+    overlap the range. The unpaginated total is returned in X-Total-Count.
+    """
+    if limit is not None and limit < 0 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit and offset must not be negative")
+    total, rows = recordings_index.query(camera, parse_time_param(start), parse_time_param(end),
+                                         min_duration, max_duration, limit, offset)
+    recordings = [{
+        "filename": row["filename"],
+        "size": row["size"],
+        "created": datetime.fromtimestamp(row["start_time"]).isoformat(),
+        "camera": row["camera"],
+        "duration": format_duration(row["duration"]),
+        "duration_seconds": round(row["duration"], 2),
+        "fps": row["fps"],
+        "start_time": row["start_time"],
+        "end_time": row["end_time"],
+        "url": f"/recordings/{row['filename']}",
+        "thumbnail": f"/api/recordings/thumbnail/{row['filename']}",
+        "sprite": f"/api/recordings/sprite/{row['filename']}"
+    } for row in rows]
+    return JSONResponse(recordings, headers={"X-Total-Count": str(total)})
 
 @app.get("/api/system_stats")
 def get_system_stats():
@@ -428,6 +2982,8 @@ def get_system_stats():
         "motion_alerts": motion_count,
         "total_recordings": system_stats["total_recordings"],
         "total_motion_events": system_stats["total_motion_events"],
+        "pre_roll_bytes": sum(hub.pre_roll.bytes for hub in camera_hubs.values()),
+        "data_usage": data_usage_report(),
         "uptime": uptime_str,
         "system_health": "healthy" if online_cameras > 0 else "degraded"
     }
@@ -438,21 +2994,102 @@ def update_camera_settings(camera_name: str, settings: dict):
     if camera_name not in CAMERAS:
         raise HTTPException(status_code=404, detail="Camera not found")
     
+    if settings.get("stream_mode", "overlay") not in STREAM_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid stream_mode. Use one of: {', '.join(STREAM_MODES)}")
+    
     camera_settings[camera_name] = settings
+    if frame_worker_pool is not None:
+        frame_worker_pool.send(camera_name, ("settings", camera_name, settings))
     return {"status": "success", "settings": camera_settings[camera_name]}
 
+def snapshot_etag(camera_name: str, seq: int, captured: float, width=None, height=None, quality=None):
+    # frame_count restarts at 0 with the process; the capture time keeps tags
+    # from an earlier run from matching a different frame
+    return f'"{camera_name}-{int(captured * 1000000):x}-{seq}-{width or 0}x{height or 0}q{quality or 0}"'
+
+async def take_snapshot(camera_name: str, max_age=None, width=None, height=None, quality=None):
+    """Fetch a camera's cached latest frame, raising HTTPException if unavailable"""
+    if camera_name not in CAMERAS:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    if (width is not None and width < 1) or (height is not None and height < 1) \
+            or (quality is not None and not 1 <= quality <= 100):
+        raise HTTPException(status_code=400, detail="Invalid width, height or quality")
+    hub = camera_hubs.get(camera_name)
+    if hub is None or hub.latest_jpeg is None:
+        raise HTTPException(status_code=503, detail="No frame received from camera yet",
+                            headers={"Retry-After": "1"})
+    seq, captured, jpg = await hub.snapshot(width, height, quality)
+    age = time.time() - captured
+    if max_age is not None and age > max_age:
+        raise HTTPException(status_code=503, detail=f"Latest frame is {age:.1f}s old",
+                            headers={"Retry-After": "1"})
+    return {
+        "seq": seq,
+        "captured": captured,
+        "age": age,
+        "etag": snapshot_etag(camera_name, seq, captured, width, height, quality),
+        "jpeg": jpg
+    }
+
+@app.get("/api/camera/{camera_name}/snapshot")
+async def get_camera_snapshot(request: Request, camera_name: str, max_age: float = None,
+                              width: int = None, height: int = None, quality: int = None):
+    """Latest JPEG from the camera's frame cache; never contacts the camera.
+
+    max_age (seconds) turns a stale frame into a 503; width/height bound
+    the output size and quality sets the JPEG quality of a resized image.
+    """
+    snapshot = await take_snapshot(camera_name, max_age, width, height, quality)
+    headers = {
+        "ETag": snapshot["etag"],
+        "Last-Modified": formatdate(snapshot["captured"], usegmt=True),
+        "X-Capture-Timestamp": datetime.fromtimestamp(snapshot["captured"]).isoformat(),
+        "Cache-Control": "no-cache"
+    }
+    if request.headers.get("if-none-match") == snapshot["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot["jpeg"], media_type="image/jpeg", headers=headers)
+
+@app.get("/api/cameras/snapshots")
+async def get_camera_snapshots(cameras: str = None, max_age: float = None,
+                               width: int = None, height: int = None, quality: int = None):
+    """Latest JPEG of several cameras in one JSON response (base64 encoded)"""
+    names = [name.strip() for name in cameras.split(",") if name.strip()] if cameras else list(CAMERAS.keys())
+    results = {}
+    for name in names:
+        try:
+            snapshot = await take_snapshot(name, max_age, width, height, quality)
+        except HTTPException as e:
+            results[name] = {"status": "error", "message": e.detail}
+            continue
+        results[name] = {
+            "status": "success",
+            "timestamp": datetime.fromtimestamp(snapshot["captured"]).isoformat(),
+            "age": round(snapshot["age"], 3),
+            "etag": snapshot["etag"],
+            "content_type": "image/jpeg",
+            "image": base64.b64encode(snapshot["jpeg"]).decode("ascii")
+        }
+    return {"snapshots": results}
+
+@app.get("/api/camera/{camera_name}/profiles")
+def get_camera_profiles(camera_name: str):
+    """List the stream profiles available for a camera"""
+    if camera_name not in CAMERAS:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    return {
+        "default": get_camera_setting(camera_name, "stream_profile"),
+        "profiles": get_stream_profiles(camera_name)
+    }
+
 @app.get("/api/camera/{camera_name}/settings")
 def get_camera_settings(camera_name: str):
     """Get camera-specific settings"""
     if camera_name not in CAMERAS:
         raise HTTPException(status_code=404, detail="Camera not found")
     
-    return camera_settings.get(camera_name, {
-        "motion_sensitivity": 500,
-        "recording_quality": "high",
-        "auto_record_motion": False,
-        "notification_enabled": True
-    })
+    return {**DEFAULT_CAMERA_SETTINGS, **camera_settings.get(camera_name, {})}
 
 @app.post("/api/cameras/bulk_action")
 def bulk_camera_action(action_data: dict):
@@ -487,12 +3124,14 @@ def bulk_camera_action(action_data: dict):
 def delete_recording(filename: str):
     """Delete a specific recording file"""
     try:
-        filepath = os.path.join("recordings", filename)
+        filepath = os.path.join(RECORDINGS_DIR, filename)
         if os.path.exists(filepath) and filename.endswith(".mp4"):
-            os.remove(filepath)
+            delete_recording_files(filename)
             return {"status": "success", "message": f"Recording {filename} deleted"}
         else:
             raise HTTPException(status_code=404, detail="Recording not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete recording: {str(e)}")
 
@@ -513,21 +3152,132 @@ def restart_system():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to restart system: {str(e)}")
 
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_metrics():
+    """Prometheus text exposition of every camera's frame-loop metrics"""
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def sample(name, value, **labels):
+        label_text = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    hubs = sorted(camera_hubs.items())
+    counters = (
+        ("cctv_camera_up", "gauge", "1 while the camera's ingest is running", lambda hub: int(hub.running)),
+        ("cctv_camera_ingest_fps", "gauge", "Measured capture frame rate", lambda hub: round(hub.capture_fps, 3)),
+        ("cctv_camera_frames_total", "counter", "Frames received from the camera", lambda hub: hub.frame_count),
+        ("cctv_camera_bytes_received_total", "counter", "Stream bytes received from the camera",
+         lambda hub: hub.bytes_received),
+        ("cctv_camera_reconnects_total", "counter", "Upstream stream failures followed by a reconnect",
+         lambda hub: hub.reconnects),
+        ("cctv_camera_frames_decoded_total", "counter", "Frames decoded for pixel work",
+         lambda hub: hub.decoded_count),
+        ("cctv_camera_pixel_skipped_total", "counter", "Frames skipped for pixel work while a job was in flight",
+         lambda hub: hub.skipped_count),
+        ("cctv_camera_frames_oversize_total", "counter",
+         "Frames dropped in worker mode for not fitting a shared-memory ring slot",
+         lambda hub: hub.frames_oversize),
+        ("cctv_camera_idle", "gauge", "1 while adaptive rate has the camera at its idle rate",
+         lambda hub: int(hub.idle)),
+        ("cctv_camera_stream_bytes_sent_total", "counter", "Live stream bytes sent to viewers",
+         lambda hub: hub.stream_bytes_sent),
+        ("cctv_camera_stream_bytes_saved_total", "counter", "Live stream bytes not sent while idle",
+         lambda hub: hub.rate_stats()["stream_bytes_saved"]),
+        ("cctv_camera_recording_frames_saved_total", "counter", "Frames not recorded while idle",
+         lambda hub: hub.record_frames_saved),
+        ("cctv_recording_queue_depth", "gauge", "Frames waiting in the recording writer queue",
+         lambda hub: hub.writer.queue.qsize() if hub.writer is not None else 0),
+        ("cctv_recording_frames_dropped", "gauge", "Frames dropped by the current recording writer",
+         lambda hub: hub.writer.frames_dropped if hub.writer is not None else 0),
+    )
+    for name, kind, help_text, value in counters:
+        family(name, kind, help_text)
+        for cam_name, hub in hubs:
+            sample(name, value(hub), camera=cam_name)
+
+    family("cctv_camera_stage_latency_seconds", "histogram", "Frame-loop stage latency")
+    for cam_name, hub in hubs:
+        for stage, histogram in hub.stage_latency.items():
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                sample("cctv_camera_stage_latency_seconds_bucket", cumulative, camera=cam_name, stage=stage, le=bound)
+            sample("cctv_camera_stage_latency_seconds_sum", round(histogram.sum, 6), camera=cam_name, stage=stage)
+            sample("cctv_camera_stage_latency_seconds_count", histogram.count, camera=cam_name, stage=stage)
+
+    family("cctv_camera_viewers", "gauge", "Connected viewers per channel")
+    for cam_name, hub in hubs:
+        for channel, group in list(hub._subscribers.items()):
+            sample("cctv_camera_viewers", len(group), camera=cam_name, channel=channel)
+
+    family("cctv_camera_viewer_frames_dropped_total", "counter",
+           "Frames overwritten before a viewer consumed them, per channel")
+    for cam_name, hub in hubs:
+        channels = set(hub.closed_drops) | {channel for channel, group in hub._subscribers.items() if group}
+        for channel in sorted(channels):
+            dropped = hub.closed_drops.get(channel, 0)
+            dropped += sum(subscriber.dropped for subscriber in hub._subscribers.get(channel, ()))
+            sample("cctv_camera_viewer_frames_dropped_total", dropped, camera=cam_name, channel=channel)
+
+    family("cctv_recordings_bytes", "gauge", "Bytes of indexed recordings per camera")
+    for cam_name, usage in sorted(recordings_index.usage().items()):
+        sample("cctv_recordings_bytes", usage["bytes"], camera=cam_name)
+    family("cctv_recordings_pruned_bytes_total", "counter", "Recording bytes deleted by retention")
+    sample("cctv_recordings_pruned_bytes_total", retention_manager.pruned_bytes)
+
+    family("cctv_motion_events_total", "counter", "Motion detections across all cameras")
+    sample("cctv_motion_events_total", system_stats["total_motion_events"])
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics endpoint"""
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
-def health_check():
+async def health_check():
     """System health check endpoint"""
     online_cameras = sum(1 for status in camera_status.values() if status.get("status") == "online")
+    now = time.monotonic()
+    cameras = {name: hub.loop_state(now) for name, hub in camera_hubs.items()}
+    streaming = sum(1 for state in cameras.values() if state["state"] == "streaming")
+
+    writers = [hub.writer for hub in camera_hubs.values() if hub.writer is not None]
+    if not writers:
+        recording_service = "idle"
+    elif all(writer.is_alive() for writer in writers):
+        recording_service = "running"
+    else:
+        recording_service = "degraded"
+
+    if frame_executor is None:
+        motion_detection = "stopped"
+    else:
+        motion_detection = "running" if streaming else "idle"
+
+    services = {
+        "camera_monitor": "running" if health_monitor.is_alive() else "stopped",
+        "motion_detection": motion_detection,
+        "recording_service": recording_service,
+        "retention": "running" if retention_manager.is_alive() else "stopped"
+    }
+    if frame_worker_pool is not None:
+        alive = frame_worker_pool.alive_count()
+        services["frame_workers"] = "running" if alive == frame_worker_pool.processes else "degraded"
     
     health_status = {
         "status": "healthy" if online_cameras > 0 else "unhealthy",
         "timestamp": datetime.now().isoformat(),
         "cameras_online": online_cameras,
         "total_cameras": len(CAMERAS),
-        "services": {
-            "camera_monitor": "running",
-            "motion_detection": "running",
-            "recording_service": "running"
-        }
+        "services": services,
+        "cameras": cameras
     }
     
     return health_status
@@ -2,40 +2,50 @@ class OptimizedCCTVManager {
     constructor() {
         this.cameras = [];
         this.recordingStates = {};
-        this.statusUpdateInterval = null;
-        this.motionCheckInterval = null;
+        this.cameraStatus = {};
+        this.events = null;
         this.init();
     }
 
     init() {
         this.setupEventListeners();
-        this.startOptimizedUpdates();
         this.updateSystemStatus(true);
     }
 
     setupEventListeners() {
-        // Optimize update intervals
-        this.statusUpdateInterval = setInterval(() => {
-            this.loadCameraStatus();
-        }, 10000); // Every 10 seconds instead of 30
-
-        this.motionCheckInterval = setInterval(() => {
-            this.checkMotionAlerts();
-        }, 2000); // Every 2 seconds instead of 5
-    }
+        // Server pushes status, motion and recording events; no polling
+        this.events = new EventSource('/api/events');
 
-    async loadCameraStatus() {
-        try {
-            const response = await fetch('/api/camera_status', {
-                cache: 'no-cache'
-            });
-            const status = await response.json();
-            this.updateStatusDisplay(status);
+        this.events.addEventListener('snapshot', (e) => {
+            this.cameraStatus = JSON.parse(e.data).cameras;
+            this.updateStatusDisplay(this.cameraStatus);
             this.updateSystemStatus(true);
-        } catch (error) {
-            console.error('Status load error:', error);
-            this.updateSystemStatus(false);
-        }
+        });
+
+        this.events.addEventListener('health', (e) => {
+            const { data } = JSON.parse(e.data);
+            this.cameraStatus[data.camera] = data;
+            this.updateStatusDisplay(this.cameraStatus);
+        });
+
+        this.events.addEventListener('motion', (e) => {
+            this.showMotionAlert(JSON.parse(e.data).data.camera);
+        });
+
+        this.events.addEventListener('recording', (e) => {
+            const { data } = JSON.parse(e.data);
+            const recIndicator = document.getElementById(`rec-${data.camera}`);
+            if (recIndicator) {
+                recIndicator.style.display = data.recording ? 'block' : 'none';
+            }
+            if (data.trigger === 'manual') {
+                this.recordingStates[data.camera] = data.recording;
+            }
+        });
+
+        // EventSource reconnects by itself and resumes via Last-Event-ID
+        this.events.onerror = () => this.updateSystemStatus(false);
+        this.events.onopen = () => this.updateSystemStatus(true);
     }
 
     updateStatusDisplay(status) {
@@ -85,23 +95,14 @@ class OptimizedCCTVManager {
         }
     }
 
-    async checkMotionAlerts() {
-        try {
-            const response = await fetch('/api/motion_alerts');
-            const alerts = await response.json();
-            
-            Object.entries(alerts).forEach(([camera, alert]) => {
-                const motionIndicator = document.getElementById(`motion-${camera}`);
-                if (motionIndicator) {
-                    motionIndicator.style.display = 'block';
-                    // Auto-hide after 2 seconds
-                    setTimeout(() => {
-                        motionIndicator.style.display = 'none';
-                    }, 2000);
-                }
-            });
-        } catch (error) {
-            // Fail silently for performance
+    showMotionAlert(camera) {
+        const motionIndicator = document.getElementById(`motion-${camera}`);
+        if (motionIndicator) {
+            motionIndicator.style.display = 'block';
+            // Auto-hide after 2 seconds
+            setTimeout(() => {
+                motionIndicator.style.display = 'none';
+            }, 2000);
         }
     }
 
@@ -203,17 +204,9 @@ class OptimizedCCTVManager {
         }
     }
 
-    startOptimizedUpdates() {
-        // Load status immediately
-        this.loadCameraStatus();
-    }
-
     destroy() {
-        if (this.statusUpdateInterval) {
-            clearInterval(this.statusUpdateInterval);
-        }
-        if (this.motionCheckInterval) {
-            clearInterval(this.motionCheckInterval);
+        if (this.events) {
+            this.events.close();
         }
     }
 }
@@ -0,0 +1,17 @@
+"""Import main from a scratch working directory.
+
+main creates recordings/, static/ and its SQLite index relative to the
+working directory at import time, so tests run it in a temporary one.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="cctv-tests-")
+
+sys.path.insert(0, REPO_DIR)
+os.chdir(WORK_DIR)
+atexit.register(shutil.rmtree, WORK_DIR, True)
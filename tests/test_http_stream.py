@@ -0,0 +1,75 @@
+import asyncio
+import base64
+
+import pytest
+
+import main
+
+
+async def serve(handler):
+    """Start a one-route-per-request HTTP server; returns (server, base_url, requests_seen)"""
+    seen = []
+
+    async def handle(reader, writer):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        request_line, *header_lines = head.strip().split("\r\n")
+        headers = dict(line.split(": ", 1) for line in header_lines)
+        path = request_line.split()[1]
+        seen.append((path, headers.get("Authorization")))
+        writer.write(handler(path))
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}", seen
+
+
+def redirect(location, code=302):
+    return f"HTTP/1.1 {code} Found\r\nLocation: {location}\r\nContent-Length: 0\r\n\r\n".encode()
+
+
+def body(data):
+    return b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\n" + data
+
+
+async def read_all(url):
+    return b"".join([chunk async for chunk in main.read_http_stream(url, timeout=2)])
+
+
+def test_follows_redirects_keeping_credentials_on_same_host():
+    async def run():
+        routes = {"/video": redirect("/stream"), "/final": body(b"frames")}
+        server, base, seen = await serve(routes.get)
+        # An absolute Location without credentials, back to the same host
+        routes["/stream"] = redirect(base + "/final", 301)
+        user_url = base.replace("http://", "http://user:pw@")
+        async with server:
+            data = await read_all(user_url + "/video")
+        return data, seen
+
+    data, seen = asyncio.run(run())
+    assert data == b"frames"
+    auth = "Basic " + base64.b64encode(b"user:pw").decode()
+    assert seen == [("/video", auth), ("/stream", auth), ("/final", auth)]
+
+
+def test_redirect_loop_is_an_error():
+    async def run():
+        server, base, seen = await serve(lambda path: redirect("/again"))
+        async with server:
+            with pytest.raises(RuntimeError, match="redirects"):
+                await read_all(base + "/again")
+        return seen
+
+    assert len(asyncio.run(run())) == main.STREAM_MAX_REDIRECTS + 1
+
+
+def test_error_status_is_raised():
+    async def run():
+        server, base, seen = await serve(lambda path: b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+        async with server:
+            with pytest.raises(RuntimeError, match="404"):
+                await read_all(base + "/missing")
+
+    asyncio.run(run())
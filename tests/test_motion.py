@@ -0,0 +1,44 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import main
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def scene(box=None):
+    rng = np.random.default_rng(0)
+    small = rng.integers(40, 200, (HEIGHT // 16, WIDTH // 16, 3), dtype=np.uint8)
+    frame = cv2.resize(small, (WIDTH, HEIGHT), interpolation=cv2.INTER_CUBIC)
+    if box is not None:
+        x, y, size = box
+        frame[y:y + size, x:x + size] = 255
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def motion_area(profiles):
+    """Area reported for a moved box when frames are decoded for profiles"""
+    hub = main.CameraHub("motion-test", "http://127.0.0.1:1/")
+    hub._motion_detected = lambda now, area, boxes=(): None
+    # The first full decode learns the source width, as on a live camera
+    hub._decode_for_profiles(scene(), {})
+    background, moved = scene(), scene((400, 200, 160))
+    for jpg in (background, background, moved):
+        frame = hub._decode_for_profiles(jpg, profiles) if profiles is not None else None
+        hub._check_motion(jpg, frame, time.monotonic())
+    return hub._motion.last_area
+
+
+@pytest.mark.parametrize("profiles", [
+    {"medium": main.STREAM_PROFILES["medium"]},
+    {"thumb": main.STREAM_PROFILES["thumb"]},
+    {"decoded": {"width": main.WORKER_DECODED_WIDTH, "raw": True}},
+    None,
+], ids=["medium", "thumb", "worker-decoded", "no-viewer"])
+def test_motion_area_independent_of_decode_scale(profiles):
+    full = motion_area({"full": main.STREAM_PROFILES["full"]})
+    assert full > 0
+    assert motion_area(profiles) == pytest.approx(full, rel=0.25)
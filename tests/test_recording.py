@@ -0,0 +1,92 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import main
+
+
+def jpeg(width=160, height=120):
+    return cv2.imencode('.jpg', np.zeros((height, width, 3), np.uint8))[1].tobytes()
+
+
+def write(camera, frames):
+    """Run a RecordingWriter over (timestamp, fps, idle) frames; returns its indexed segments"""
+    writer = main.RecordingWriter(camera, len(frames) + 1)
+    jpg = jpeg()
+    for timestamp, fps, idle in frames:
+        writer.submit(jpg, timestamp, fps, idle)
+    writer.start()
+    writer.close()
+    writer.join()
+    total, segments = main.recordings_index.query(camera=camera)
+    return sorted(segments, key=lambda segment: segment["start_time"])
+
+
+class SubmitLog:
+    def __init__(self):
+        self.frames = []
+
+    def submit(self, jpg, timestamp, fps, idle=False):
+        self.frames.append((timestamp, fps, idle))
+
+
+def test_idle_gate_admits_exactly_the_idle_rate(monkeypatch):
+    hub = main.CameraHub("idle-gate", "http://127.0.0.1:1/")
+    hub.writer = SubmitLog()
+    hub.idle = True
+    hub.capture_fps = 15.0
+    monkeypatch.setitem(main.camera_recordings, hub.name, True)
+    clock = [1_000_000.0]
+    monkeypatch.setattr(main.time, "time", lambda: clock[0])
+    jpg = jpeg()
+    for _ in range(15 * 60):
+        hub._update_recording(jpg, time.monotonic())
+        clock[0] += 1 / 15
+    timestamps = [timestamp for timestamp, fps, idle in hub.writer.frames]
+    # One frame per second of input, so duration at the written rate matches
+    assert len(timestamps) == 60
+    assert timestamps[-1] - timestamps[0] == pytest.approx(59, abs=1 / 15)
+    assert {fps for timestamp, fps, idle in hub.writer.frames} == {1.0}
+
+
+def test_idle_transition_rotates_within_the_same_second():
+    start = int(time.time()) - 3600 + 0.1
+    frames = [(start + i / 10, 10.0, False) for i in range(3)]
+    frames += [(start + 0.3, 1.0, True)]
+    frames += [(start + 0.4 + i / 10, 10.0, False) for i in range(3)]
+    segments = write("idle-rotate", frames)
+    assert [(segment["fps"], segment["frames"]) for segment in segments] == [(10.0, 3), (1.0, 1), (10.0, 3)]
+    assert len({segment["filename"] for segment in segments}) == 3
+
+
+def test_capture_rate_drift_does_not_rotate():
+    start = int(time.time()) - 7200
+    start -= start % 300
+    frames = [(start + i / 10, 5.0 if i % 2 else 10.0, False) for i in range(60)]
+    segments = write("drift", frames)
+    assert len(segments) == 1
+
+
+def test_segment_waits_for_measured_capture_fps():
+    start = int(time.time()) - 10800
+    start -= start % 300
+    # The hub reports 15 fps once its first one-second window closes
+    frames = [(start + i / 15, 0.0 if i < 18 else 15.0, False) for i in range(45)]
+    segments = write("fps-wait", frames)
+    assert [(segment["fps"], segment["frames"]) for segment in segments] == [(15.0, 45)]
+
+
+def test_unmeasured_fps_estimated_from_bursty_timestamps():
+    start = int(time.time()) - 14400
+    start -= start % 300
+    # 15 fps source delivered two or three frames per network read
+    frames, t = [], start
+    for burst in [2, 3] * 6:
+        for i in range(burst):
+            frames.append((t + i * 0.001, 0.0, False))
+        t += burst / 15
+    segments = write("fps-burst", frames)
+    assert len(segments) == 1
+    assert segments[0]["fps"] == pytest.approx(15.0, rel=0.05)
@@ -0,0 +1,124 @@
+import os
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+DAY = 86400
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Empty recordings dir and index, no budgets, no cameras recording"""
+    recordings = tmp_path / "recordings"
+    (recordings / "thumbnails").mkdir(parents=True)
+    monkeypatch.setattr(main, "RECORDINGS_DIR", str(recordings))
+    monkeypatch.setattr(main, "THUMBNAILS_DIR", str(recordings / "thumbnails"))
+    monkeypatch.setattr(main, "recordings_index", main.RecordingsIndex(str(recordings / "index.db")))
+    monkeypatch.setattr(main, "retention_manager", main.RetentionManager())
+    monkeypatch.setattr(main, "camera_hubs", {})
+    monkeypatch.setattr(main, "camera_settings", {})
+    monkeypatch.setattr(main, "RETENTION_MAX_BYTES", 0)
+    monkeypatch.setattr(main, "RETENTION_MAX_AGE_DAYS", 0)
+    monkeypatch.setattr(main, "RETENTION_MIN_FREE_BYTES", 0)
+    return recordings
+
+
+def add(store, camera, start, seconds=60, size=100):
+    """Write and index a segment; returns its filename"""
+    filename = f"{camera}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(start))}.mp4"
+    (store / filename).write_bytes(b"\0" * size)
+    (store / "thumbnails" / filename.replace(".mp4", ".jpg")).write_bytes(b"\0")
+    main.recordings_index.upsert(filename, camera, start, start + seconds, 10.0, seconds * 10, size, start)
+    return filename
+
+
+def remaining(store):
+    return sorted(name for name in os.listdir(store) if name.endswith(".mp4"))
+
+
+def recording(camera, filename):
+    """Mark filename as the segment camera's writer is currently writing"""
+    main.camera_hubs[camera] = SimpleNamespace(writer=SimpleNamespace(current_file=filename))
+
+
+def test_no_budgets_delete_nothing(store, monkeypatch):
+    now = time.time()
+    names = [add(store, "gate", now - 400 * DAY + i * 3600) for i in range(3)]
+    monkeypatch.setattr(main.shutil, "disk_usage", lambda path: DiskUsage(10 ** 9, 10 ** 9, 0))
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted(names)
+
+
+def test_max_age_removes_only_segments_ending_before_the_cutoff(store, monkeypatch):
+    now = time.time()
+    old = add(store, "gate", now - 3 * DAY)
+    straddling = add(store, "gate", now - DAY - 30, seconds=60)
+    new = add(store, "gate", now - 3600)
+    other = add(store, "yard", now - 3 * DAY)
+    monkeypatch.setitem(main.camera_settings, "gate", {"retention_max_age_days": 1})
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted([straddling, new, other])
+    assert main.recordings_index.get(old) is None
+    assert not os.path.exists(store / "thumbnails" / old.replace(".mp4", ".jpg"))
+
+
+def test_global_max_age(store, monkeypatch):
+    now = time.time()
+    add(store, "gate", now - 3 * DAY)
+    add(store, "yard", now - 3 * DAY)
+    kept = [add(store, "gate", now - 60), add(store, "yard", now - 60)]
+    monkeypatch.setattr(main, "RETENTION_MAX_AGE_DAYS", 1)
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted(kept)
+
+
+def test_camera_budget_removes_that_cameras_oldest_first(store, monkeypatch):
+    start = time.time() - DAY
+    gate = [add(store, "gate", start + i * 60) for i in range(5)]
+    yard = [add(store, "yard", start + i * 60) for i in range(5)]
+    monkeypatch.setitem(main.camera_settings, "gate", {"retention_max_bytes": 250})
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted(gate[3:] + yard)
+    assert main.recordings_index.usage()["gate"] == {"bytes": 200, "segments": 2}
+    assert main.retention_manager.pruned_bytes == 300
+
+
+def test_global_budget_removes_oldest_across_cameras(store, monkeypatch):
+    start = time.time() - DAY
+    names = [add(store, "gate" if i % 2 else "yard", start + i * 60) for i in range(6)]
+    monkeypatch.setattr(main, "RETENTION_MAX_BYTES", 300)
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted(names[3:])
+
+
+def test_low_disk_floor_frees_just_enough(store, monkeypatch):
+    start = time.time() - DAY
+    names = [add(store, "gate", start + i * 60, size=1000) for i in range(5)]
+
+    def disk_usage(path):
+        freed = 1000 * (5 - len(remaining(store)))
+        return DiskUsage(10 ** 6, 10 ** 6 - 500 - freed, 500 + freed)
+
+    monkeypatch.setattr(main.shutil, "disk_usage", disk_usage)
+    monkeypatch.setattr(main, "RETENTION_MIN_FREE_BYTES", 2000)
+    main.retention_manager.enforce()
+    assert remaining(store) == sorted(names[2:])
+
+
+def test_active_segment_is_never_removed(store, monkeypatch):
+    now = time.time()
+    active = add(store, "gate", now - 5 * DAY)
+    others = [add(store, "gate", now - 4 * DAY + i * 60) for i in range(3)]
+    recording("gate", active)
+    monkeypatch.setattr(main, "RETENTION_MAX_AGE_DAYS", 1)
+    monkeypatch.setattr(main, "RETENTION_MAX_BYTES", 1)
+    monkeypatch.setitem(main.camera_settings, "gate", {"retention_max_bytes": 1})
+    main.retention_manager.enforce()
+    assert remaining(store) == [active]
+    assert main.recordings_index.get(active) is not None
+    assert not [name for name in others if os.path.exists(store / name)]
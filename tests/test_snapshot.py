@@ -0,0 +1,24 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+import main
+
+
+def snapshot_after_boot(monkeypatch, captured):
+    """Snapshot of a freshly started hub whose first frame was captured at captured"""
+    hub = main.CameraHub("snap", "http://127.0.0.1:1/")
+    hub.latest_jpeg = cv2.imencode('.jpg', np.zeros((48, 64, 3), np.uint8))[1].tobytes()
+    hub.latest_jpeg_time = captured
+    hub.frame_count = 1
+    monkeypatch.setitem(main.CAMERAS, hub.name, hub.url)
+    monkeypatch.setitem(main.camera_hubs, hub.name, hub)
+    return asyncio.run(main.take_snapshot(hub.name))
+
+
+def test_etag_differs_across_restarts(monkeypatch):
+    before = snapshot_after_boot(monkeypatch, 1_700_000_000.25)
+    after = snapshot_after_boot(monkeypatch, 1_700_000_600.5)
+    assert before["seq"] == after["seq"]
+    assert before["etag"] != after["etag"]
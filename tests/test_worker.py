@@ -0,0 +1,24 @@
+import queue
+
+import main
+
+
+def test_oversize_frames_are_counted_and_exported(monkeypatch):
+    ring = main.SharedFrameRing(slots=2, slot_size=64)
+    worker_hub = main.WorkerCameraHub("ring-cam", "http://127.0.0.1:1/", queue.Queue())
+    try:
+        worker_hub.set_channels({"passthrough": ring.name}, False, {"passthrough": 1})
+        worker_hub._publish("passthrough", b"\xff" * 32)
+        worker_hub._publish("passthrough", b"\xff" * 65)
+        assert [record[-1] for record in ring.read()] == [b"\xff" * 32]
+        assert worker_hub.frames_oversize == 1
+
+        # The parent adopts the worker's counters from its stats message
+        hub = main.RemoteCameraHub("ring-cam", "http://127.0.0.1:1/", None)
+        hub.load_metrics(worker_hub.metrics_snapshot())
+        assert hub.loop_state()["frames_oversize"] == 1
+        monkeypatch.setitem(main.camera_hubs, hub.name, hub)
+        assert 'cctv_camera_frames_oversize_total{camera="ring-cam"} 1' in main.render_metrics()
+    finally:
+        worker_hub.stop()
+        ring.close(unlink=True)